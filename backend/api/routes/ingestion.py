@@ -1,37 +1,64 @@
 from __future__ import annotations
 
-import secrets
+import asyncio
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from backend.api.services.document_processor import (
     start_ingestion_job,
     get_job_status,
-    init_storage,
     create_job_record,
+    new_job_id,
     reset_ingestion,
 )
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Jobs run one at a time off the event loop (waiting jobs report "queued"); each job fans out to its own
+# extraction process pool and shares the single in-process embedding model
+_ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+
+
+def _log_job_failure(job_id: str, fut: asyncio.Future) -> None:
+    # Jobs record their own errors; this catches the ones that could not be recorded
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.error("ingestion job %s failed", job_id, exc_info=fut.exception())
 
 
 @router.post("/upload-documents")
-async def upload_documents(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)):
+async def upload_documents(files: List[UploadFile] = File(...)):
     """Accept multiple files, start background ingestion job, return job_id."""
-    init_storage()
-    job_id = secrets.token_hex(8)
+    job_id = new_job_id()
 
-    # Read files into memory (small to moderate docs; OK for assignment scope)
+    # Stream each upload to a spool file in 1 MiB reads instead of holding it in memory
     file_payload = []
-    for f in files:
-        data = await f.read()
-        file_payload.append((f.filename, data, f.content_type))
-
-    # Create job row now so clients can poll immediately
-    create_job_record(job_id, total_files=len(file_payload))
-    background_tasks.add_task(start_ingestion_job, job_id, file_payload)
+    try:
+        for f in files:
+            suffix = os.path.splitext(f.filename or "")[1]
+            with tempfile.NamedTemporaryFile(delete=False, prefix="upload-", suffix=suffix) as spool:
+                file_payload.append((f.filename, spool.name, f.content_type))
+                while chunk := await f.read(1 << 20):
+                    await run_in_threadpool(spool.write, chunk)
+        # Create job row now so clients can poll immediately (off the event loop: it writes)
+        await run_in_threadpool(create_job_record, job_id, total_files=len(file_payload))
+    except Exception:
+        # No job will own the spool files
+        for (_, path, _) in file_payload:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        raise
+    job = asyncio.get_running_loop().run_in_executor(_ingest_executor, start_ingestion_job, job_id, file_payload)
+    job.add_done_callback(lambda fut: _log_job_failure(job_id, fut))
     return {"ok": True, "job_id": job_id}
 
 
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+from typing import List
+
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
-from backend.api.services.query_engine import process_query, recent_history, get_metrics, reset_metrics
+from backend.api.services.query_engine import process_query, process_queries, recent_history, get_metrics, reset_metrics
 
 router = APIRouter()
 
@@ -17,9 +20,20 @@ class QueryPayload(BaseModel):
     doc_offset: int = 0
 
 
+class BatchQueryPayload(BaseModel):
+    queries: List[str]
+    connection_string: str | None = None
+    limit: int = 50
+    offset: int = 0
+    doc_limit: int = 8
+    doc_offset: int = 0
+
+
 @router.post("/query")
 async def query_endpoint(payload: QueryPayload):
-    result = process_query(
+    # Off the event loop so concurrent requests overlap and their query encodes coalesce
+    result = await run_in_threadpool(
+        process_query,
         payload.query,
         connection_string=payload.connection_string,
         limit=payload.limit,
@@ -30,6 +44,20 @@ async def query_endpoint(payload: QueryPayload):
     return {"ok": True, **result}
 
 
+@router.post("/query/batch")
+async def query_batch_endpoint(payload: BatchQueryPayload):
+    results = await run_in_threadpool(
+        process_queries,
+        payload.queries,
+        connection_string=payload.connection_string,
+        limit=payload.limit,
+        offset=payload.offset,
+        doc_limit=payload.doc_limit,
+        doc_offset=payload.doc_offset,
+    )
+    return {"ok": True, "results": [{"ok": True, **r} for r in results]}
+
+
 @router.get("/query/history")
 async def query_history():
     return {"ok": True, "history": recent_history()}
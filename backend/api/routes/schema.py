@@ -11,12 +11,12 @@ class ConnectRequest(BaseModel):
 
 
 @router.post("/connect-database")
-def connect_database(payload: ConnectRequest):
+def connect_database(payload: ConnectRequest, refresh: bool = False, row_counts: bool = False, hints: bool = False):
     try:
         cs = (payload.connection_string or "").strip()
         if not cs:
             raise ValueError("Connection string is required")
-        schema = analyze_database(cs)
+        schema = analyze_database(cs, refresh=refresh, row_counts=row_counts, hints=hints)
         return {"ok": True, "schema": schema}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
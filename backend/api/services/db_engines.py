@@ -0,0 +1,64 @@
+"""Process-wide SQLAlchemy engines, one pooled engine per connection string.
+
+Schema discovery and the query engine share these, so a database connected
+through /api/connect-database reuses the same authenticated pool for queries.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+# Server DBs keep throughput up to ~25-50 pooled connections under concurrent load
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "25"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "25"))
+DB_POOL_RECYCLE_SEC = 1800
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _engine_options(conn_str: str) -> Dict[str, Any]:
+    url = make_url(conn_str)
+    if url.get_backend_name() != "sqlite":
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_recycle": DB_POOL_RECYCLE_SEC,
+            "pool_pre_ping": True,
+            # LIFO checkout reuses the hottest connections and lets idle ones age out
+            "pool_use_lifo": True,
+        }
+    # SQLite needs special args for pooling/threading
+    opts: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+    if url.database in (None, "", ":memory:"):
+        # Every pooled connection would get its own empty in-memory DB; share one
+        opts["poolclass"] = StaticPool
+    else:
+        # File DBs: readers run concurrently under WAL, so keep a pool, minus the network knobs
+        opts.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_use_lifo=True)
+    return opts
+
+
+def get_engine(conn_str: str) -> Engine:
+    eng = _engines.get(conn_str)
+    if eng is not None:
+        return eng
+    with _engines_lock:
+        eng = _engines.get(conn_str)
+        if eng is None:
+            eng = _engines[conn_str] = create_engine(conn_str, future=True, **_engine_options(conn_str))
+        return eng
+
+
+def dispose_engines() -> None:
+    """Close every pooled connection (app shutdown); engines reconnect if used again."""
+    with _engines_lock:
+        engines = list(_engines.values())
+    for eng in engines:
+        eng.dispose()
@@ -1,39 +1,191 @@
 from __future__ import annotations
 
 import csv
+import hashlib
 import io
 import json
+import multiprocessing as mp
 import os
+import queue
 import re
+import secrets
 import sqlite3
 import threading
 import time
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple
 
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from docx import Document as DocxDocument
 from pypdf import PdfReader
 
+from backend.nlp.embeddings import embedding_batch_size, get_model
+from backend.nlp.quantize import dequantize_int8, pack_int8
+
+try:
+    import sqlite_vec
+except Exception:  # optional: native KNN over chunk embeddings
+    sqlite_vec = None
+
+try:
+    import pypdfium2 as pdfium
+except Exception:  # optional: PDFium-backed PDF text extraction
+    pdfium = None
+
+try:
+    from blake3 import blake3
+except Exception:  # optional: SIMD hashing for cache keys and job ids
+    blake3 = None
+
 
 STORAGE_DIR = os.path.join(os.getcwd(), "storage")
 DB_PATH = os.path.join(STORAGE_DIR, "ingestion.db")
 
-_model_lock = threading.Lock()
-_model: SentenceTransformer | None = None
 
+def _get_model() -> Any:
+    # CUDA SentenceTransformer, else int8 ONNX MiniLM when exported, else PyTorch on CPU
+    return get_model()
+
+
+# Commit job progress every N files so status polling sees it mid-job
+PROGRESS_COMMIT_EVERY = 8
+# Ingestion pipeline: bounded queue depth (documents) between stages, and
+# how many chunks the embedding stage merges across files per encode call
+PIPELINE_QUEUE_DEPTH = 8
+EMBED_BATCH_CHUNKS = 512
+# Rows per multi-VALUES INSERT into chunks
+INSERT_GROUP_ROWS = 500
+# Longest chunk handed to the encoder; MiniLM truncates at 256 tokens
+# (~1000 chars) anyway, so tokenizing more is wasted work
+MAX_CHARS = 1200
+_DONE = object()
+
+# dynamic_chunking patterns (case-insensitive on the original text, no lowered copy)
+_RESUME_PROBE = re.compile(r"\b(skills|experience|education|projects)\b", re.IGNORECASE)
+_RESUME_SPLIT = re.compile(r"\n\s*(?=skills|experience|education|projects)\b", re.IGNORECASE)
+_CLAUSE_PROBE = re.compile(r"\n\s*\d+\.\s+")
+_CLAUSE_SPLIT = re.compile(r"\n\s*(?=\d+\.)")
+_PARA_SPLIT = re.compile(r"\n\s*\n")
 
-def _get_model() -> SentenceTransformer:
-    global _model
-    with _model_lock:
-        if _model is None:
-            # all-MiniLM-L6-v2: compact, fast
-            _model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        return _model
+
+# Dimension of the sqlite-vec chunks_vec table (all-MiniLM-L6-v2)
+VEC_DIM = 384
+_vec_available: bool | None = None
+
+
+def load_vec_extension(conn: sqlite3.Connection) -> bool:
+    """Load sqlite-vec (vec0) into `conn`; False when it is not available."""
+    global _vec_available
+    if _vec_available is False:
+        return False
+    try:
+        conn.execute("SELECT vec_version()")
+        return True  # already loaded on this connection
+    except sqlite3.OperationalError:
+        pass
+    try:
+        conn.enable_load_extension(True)
+        try:
+            if sqlite_vec is not None:
+                sqlite_vec.load(conn)
+            else:
+                conn.load_extension("vec0")
+        finally:
+            conn.enable_load_extension(False)
+        _vec_available = True
+    except (AttributeError, sqlite3.OperationalError):
+        # AttributeError: this Python's sqlite3 was built without extension loading
+        _vec_available = False
+    return _vec_available
+
+
+_tls = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the ingestion DB with per-connection pragmas tuned for bulk writes and scans.
+
+    The connection is in autocommit mode; writers batch with _transaction().
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # 64 MiB page cache (negative = KiB) so search scans stay off the default 2 MiB
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+    # chunks.document_id FK is informational; skip per-insert enforcement
+    conn.execute("PRAGMA foreign_keys=OFF")
+    load_vec_extension(conn)
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """This thread's cached ingestion DB connection (opened on first use, never closed)."""
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        conn = _tls.conn = _connect()
+    return conn
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """BEGIN IMMEDIATE ... COMMIT, rolling back if the block raises."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# Databases whose schema this process has already created or found current
+_initialized: Set[str] = set()
+_init_lock = threading.Lock()
 
 
 def init_storage() -> None:
-    os.makedirs(STORAGE_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    """Create or migrate the ingestion schema, once per process and database.
+
+    Later calls return without touching the DB, and a schema that is already
+    current is only read, so status polls and uploads never wait on the
+    ingest writer's lock.
+    """
+    if DB_PATH in _initialized:
+        return
+    with _init_lock:
+        if DB_PATH in _initialized:
+            return
+        os.makedirs(STORAGE_DIR, exist_ok=True)
+        conn = get_connection()
+        if not _schema_current(conn):
+            # Larger pages suit the BLOB-heavy tables; only applies when the DB is created
+            conn.execute("PRAGMA page_size=8192")
+            # WAL is persistent in the DB file: readers no longer block the ingest writer
+            conn.execute("PRAGMA journal_mode=WAL")
+            with _transaction(conn):
+                _create_tables(conn)
+        _initialized.add(DB_PATH)
+
+
+def _schema_current(conn: sqlite3.Connection) -> bool:
+    """True when every table, column and index _create_tables makes already exists (read-only)."""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    wanted = {"jobs", "documents", "chunks", "emb_cache", "idx_chunks_doc", "idx_docs_job"}
+    if _vec_available:
+        wanted.add("chunks_vec")
+    if not wanted <= names:
+        return False
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+    if not {"dtype", "vec_row"} <= cols:
+        return False
+    if "dtype" not in {row[1] for row in conn.execute("PRAGMA table_info(emb_cache)")}:
+        return False
+    return conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
     # Jobs track ingestion progress
     cur.execute(
@@ -60,7 +212,10 @@ def init_storage() -> None:
         )
         """
     )
-    # Chunks table (store embedding as BLOB of float32 bytes)
+    # Chunks table. New rows keep their embedding only in the sidecar (vec_row,
+    # packed int8); the embedding BLOB is filled only by rows from before the
+    # sidecar: float32 bytes for dtype 'f32', or a float32 scale followed by
+    # int8 codes for dtype 'i8'
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS chunks (
@@ -70,52 +225,212 @@ def init_storage() -> None:
             text TEXT,
             embedding BLOB,
             dim INTEGER,
+            dtype TEXT DEFAULT 'f32',
+            vec_row INTEGER,
             FOREIGN KEY(document_id) REFERENCES documents(id)
         )
         """
     )
-    conn.commit()
-    conn.close()
+    # Older databases predate the dtype column; their rows are float32
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(chunks)")}
+    if "dtype" not in cols:
+        cur.execute("ALTER TABLE chunks ADD COLUMN dtype TEXT DEFAULT 'f32'")
+    # ... and the vec_row column pointing into the embedding sidecar files
+    if "vec_row" not in cols:
+        cur.execute("ALTER TABLE chunks ADD COLUMN vec_row INTEGER")
+        _backfill_sidecar(conn)
+    # Per-document chunk reads and per-job document lookups
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(document_id, chunk_index)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_job ON documents(job_id)")
+    # Content-addressed embedding cache: 128-bit hash (BLAKE3 or BLAKE2b) of chunk text -> embedding,
+    # stored in the chunks' packed int8 form (dtype 'i8'); older rows are float32 ('f32')
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emb_cache (
+            hash BLOB PRIMARY KEY,
+            embedding BLOB,
+            dim INTEGER,
+            dtype TEXT DEFAULT 'i8'
+        )
+        """
+    )
+    if "dtype" not in {row[1] for row in cur.execute("PRAGMA table_info(emb_cache)")}:
+        cur.execute("ALTER TABLE emb_cache ADD COLUMN dtype TEXT DEFAULT 'f32'")
+    # sqlite-vec KNN index over chunk embeddings, rowid = chunks.id
+    if _vec_available:
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_vec'").fetchone()
+        if not exists:
+            cur.execute(f"CREATE VIRTUAL TABLE chunks_vec USING vec0(embedding float[{VEC_DIM}] distance_metric=cosine)")
+            _backfill_vec(conn)
+
+
+def _decode_rows(blobs: List[Any], dtype: str) -> np.ndarray:
+    """Decode stored embedding BLOBs of one dtype into a float32 matrix."""
+    raw = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), -1)
+    if dtype != "i8":
+        return raw.view(np.float32)
+    return dequantize_int8(raw)
+
+
+def _backfill_vec(conn: sqlite3.Connection) -> None:
+    """Index chunks stored before chunks_vec existed."""
+    rows = conn.execute("SELECT id, embedding, dtype, vec_row FROM chunks WHERE dim = ?", (VEC_DIM,)).fetchall()
+    stored = [r for r in rows if r[1] is not None]
+    for dtype in {r[2] for r in stored}:
+        part = [r for r in stored if r[2] == dtype]
+        vecs = _decode_rows([r[1] for r in part], dtype)
+        conn.executemany(
+            "INSERT INTO chunks_vec (rowid, embedding) VALUES (?, ?)",
+            zip((r[0] for r in part), vecs),
+        )
+    # Rows whose embedding lives only in the sidecar
+    records = open_sidecar(VEC_DIM)
+    n_records = 0 if records is None else records.shape[0]
+    part = [r for r in rows if r[1] is None and r[3] is not None and r[3] < n_records]
+    if part:
+        picked = records[[r[3] for r in part]]
+        vecs = picked["q"].astype(np.float32) * picked["scale"][:, None]
+        conn.executemany(
+            "INSERT INTO chunks_vec (rowid, embedding) VALUES (?, ?)",
+            zip((r[0] for r in part), vecs),
+        )
+
+
+def _backfill_sidecar(conn: sqlite3.Connection) -> None:
+    """Copy chunks stored before the sidecar files existed into them."""
+    rows = conn.execute("SELECT id, embedding, dim, dtype FROM chunks").fetchall()
+    for dim, dtype in {(r[2], r[3]) for r in rows}:
+        part = [r for r in rows if r[2] == dim and r[3] == dtype]
+        vecs = _decode_rows([r[1] for r in part], dtype)
+        first = _append_sidecar(pack_int8(vecs), dim)
+        conn.executemany(
+            "UPDATE chunks SET vec_row = ? WHERE id = ?",
+            ((first + i, r[0]) for i, r in enumerate(part)),
+        )
+
+
+# ------------------------- Embedding sidecar -------------------------
+# Per-dim flat files of packed int8 records (float32 scale + dim int8 codes),
+# one per chunk at row chunks.vec_row, so search can memory-map every
+# embedding at once instead of reading per-row BLOBs. The sidecar is the only
+# copy of a new chunk's embedding (chunks.embedding stays NULL). Records are
+# appended before the rows referencing them commit: records orphaned by a
+# rolled-back insert are never referenced, and rows pointing past the end of
+# a file (cut short by a crash) are skipped by search.
+_sidecar_lock = threading.Lock()
+
+
+def sidecar_path(dim: int) -> str:
+    return os.path.join(STORAGE_DIR, f"chunks_{dim}.i8")
+
+
+def sidecar_dtype(dim: int) -> np.dtype:
+    return np.dtype([("scale", "<f4"), ("q", "i1", (dim,))])
+
+
+def _append_sidecar(packed: np.ndarray, dim: int) -> int:
+    """Append packed rows to the dim's sidecar and return the row index of the first."""
+    rec = 4 + dim
+    with _sidecar_lock, open(sidecar_path(dim), "ab") as fh:
+        size = fh.seek(0, os.SEEK_END)
+        if size % rec:
+            fh.truncate(size - size % rec)  # drop a torn partial record
+        first = size // rec
+        fh.write(memoryview(np.ascontiguousarray(packed)).cast("B"))
+    return first
+
+
+def open_sidecar(dim: int) -> np.memmap | None:
+    """Read-only structured memmap over the dim's sidecar, or None when empty/missing."""
+    path = sidecar_path(dim)
+    rec = sidecar_dtype(dim)
+    try:
+        n = os.path.getsize(path) // rec.itemsize
+    except OSError:
+        return None
+    if n == 0:
+        return None
+    return np.memmap(path, dtype=rec, mode="r", shape=(n,))
+
+
+def _remove_sidecars() -> None:
+    for name in os.listdir(STORAGE_DIR):
+        if name.startswith("chunks_") and name.endswith(".i8"):
+            try:
+                os.remove(os.path.join(STORAGE_DIR, name))
+            except OSError:
+                pass  # still mapped (Windows); new rows keep appending after the old ones
+
+
+_SUFFIX_MAP = {".pdf": "pdf", ".docx": "docx", ".csv": "csv"}
+_CT_MAP = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "text/csv": "csv",
+    "application/csv": "csv",
+}
 
 
 def _detect_doc_type(filename: str, content_type: str | None) -> str:
-    fname = filename.lower()
-    if fname.endswith(".pdf") or (content_type and "pdf" in content_type.lower()):
-        return "pdf"
-    if fname.endswith(".docx") or (content_type and "word" in content_type.lower()):
-        return "docx"
-    if fname.endswith(".csv") or (content_type and "csv" in content_type.lower()):
-        return "csv"
-    return "txt"
+    ext = os.path.splitext(filename)[1].lower()
+    return _SUFFIX_MAP.get(ext) or _CT_MAP.get((content_type or "").split(";")[0].strip().lower(), "txt")
 
 
-def _extract_text(file_bytes: bytes, doc_type: str) -> str:
+def _extract_text(path: str, doc_type: str) -> str:
+    """Extract text from a spooled upload on disk."""
     if doc_type == "pdf":
-        reader = PdfReader(io.BytesIO(file_bytes))
-        texts: List[str] = []
-        for page in reader.pages:
-            try:
-                texts.append(page.extract_text() or "")
-            except Exception:
-                texts.append("")
+        texts = _pdf_pages_pdfium(path) if pdfium is not None else _pdf_pages_pypdf(path)
         return "\n\n".join(texts).strip()
     if doc_type == "docx":
-        f = io.BytesIO(file_bytes)
-        doc = DocxDocument(f)
+        doc = DocxDocument(path)
         return "\n\n".join(p.text for p in doc.paragraphs).strip()
     if doc_type == "csv":
         # Parse CSV into a simple markdown-like table textual form
-        buf = io.StringIO(file_bytes.decode("utf-8", errors="ignore"))
-        reader = csv.reader(buf)
-        lines = [", ".join(row) for row in reader]
+        with open(path, "r", encoding="utf-8", errors="ignore", newline="", buffering=1 << 20) as fh:
+            reader = csv.reader(fh)
+            lines = [", ".join(row) for row in reader]
         return "\n".join(lines)
     # txt
+    with open(path, "rb", buffering=1 << 20) as fh:
+        file_bytes = fh.read()
     try:
         return file_bytes.decode("utf-8")
     except Exception:
         return file_bytes.decode("latin-1", errors="ignore")
 
 
+def _pdf_pages_pdfium(path: str) -> List[str]:
+    """Per-page text via PDFium (C++), several times faster than pypdf."""
+    pdf = pdfium.PdfDocument(path)
+    texts: List[str] = []
+    try:
+        for i in range(len(pdf)):
+            try:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                # PDFium ends lines with CRLF; normalize for the paragraph splitter
+                texts.append(textpage.get_text_bounded().replace("\r\n", "\n"))
+                textpage.close()
+                page.close()
+            except Exception:
+                texts.append("")
+    finally:
+        pdf.close()
+    return texts
+
+
+def _pdf_pages_pypdf(path: str) -> List[str]:
+    with open(path, "rb") as fh:
+        reader = PdfReader(fh)
+        texts: List[str] = []
+        for page in reader.pages:
+            try:
+                texts.append(page.extract_text() or "")
+            except Exception:
+                texts.append("")
+    return texts
+
+
 def dynamic_chunking(content: str, doc_type: str) -> List[str]:
     content = content.strip()
     if not content:
@@ -123,19 +438,18 @@ def dynamic_chunking(content: str, doc_type: str) -> List[str]:
 
     # Heuristics:
     if doc_type in ("pdf", "docx", "txt"):
-        lowered = content.lower()
         # Resumes: try to keep sections together
-        if any(k in lowered for k in ["skills", "experience", "education", "projects"]):
-            sections = re.split(r"\n\s*(?=skills|experience|education|projects)\b", lowered)
+        if _RESUME_PROBE.search(content):
+            sections = _RESUME_SPLIT.split(content)
             chunks = [s.strip() for s in sections if s.strip()]
             if chunks:
-                return chunks
+                return _hard_wrap(chunks, MAX_CHARS)
         # Contracts: split by numbered clauses
-        if re.search(r"\n\s*\d+\.\s+", content):
-            clauses = re.split(r"\n\s*(?=\d+\.)", content)
-            return [c.strip() for c in clauses if c.strip()]
+        if _CLAUSE_PROBE.search(content):
+            clauses = _CLAUSE_SPLIT.split(content)
+            return _hard_wrap([c.strip() for c in clauses if c.strip()], MAX_CHARS)
         # Reviews / general: paragraph-based
-        paragraphs = re.split(r"\n\s*\n", content)
+        paragraphs = _PARA_SPLIT.split(content)
         # Further chunk paragraphs to ~500-800 chars for embedding efficiency
         return _chunk_by_size(paragraphs, max_chars=800)
     if doc_type == "csv":
@@ -146,125 +460,361 @@ def dynamic_chunking(content: str, doc_type: str) -> List[str]:
 
 
 def _chunk_by_size(units: List[str], max_chars: int = 800) -> List[str]:
+    """Greedily pack newline-joined units into chunks of at most max_chars.
+
+    Break points come from a cumulative length array, so each chunk is joined
+    once instead of growing a buffer string. A unit longer than max_chars is
+    hard-wrapped.
+    """
+    n = len(units)
+    lens = np.fromiter((len(u) + 1 for u in units), dtype=np.int64, count=n)
+    cum = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lens, out=cum[1:])
     chunks: List[str] = []
-    buf = ""
-    for u in units:
-        if len(buf) + len(u) + 1 <= max_chars:
-            buf = f"{buf}\n{u}" if buf else u
-        else:
-            if buf:
-                chunks.append(buf.strip())
-            buf = u
-    if buf:
-        chunks.append(buf.strip())
+    start = 0
+    while start < n:
+        if not units[start]:
+            start += 1  # a chunk never starts with an empty unit
+            continue
+        # Largest end with len("\n".join(units[start:end])) == cum[end] - cum[start] - 1 <= max_chars
+        end = int(np.searchsorted(cum, cum[start] + max_chars + 1, side="right")) - 1
+        if end <= start:
+            # Oversized unit: its own chunk, hard-wrapped
+            chunks.extend(_hard_wrap([units[start].strip()], max_chars))
+            start += 1
+            continue
+        chunks.append("\n".join(units[start:end]).strip())
+        start = end
     return [c for c in chunks if c]
 
 
-def _embed_chunks(chunks: List[str], batch_size: int = 64) -> Tuple[List[bytes], int]:
-    """Embed in batches to avoid memory spikes on large documents."""
-    model = _get_model()
-    all_blobs: List[bytes] = []
-    dim: int | None = None
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i : i + batch_size]
-        vecs = model.encode(batch, convert_to_numpy=True, normalize_embeddings=True)
-        vecs = vecs.astype("float32")
-        if dim is None:
-            dim = vecs.shape[1] if len(vecs.shape) == 2 else len(vecs)
-        all_blobs.extend([v.tobytes() for v in vecs])
-    return all_blobs, int(dim or 0)
+def _hard_wrap(chunks: List[str], max_chars: int) -> List[str]:
+    """Split any chunk longer than max_chars into max_chars pieces."""
+    if all(len(c) <= max_chars for c in chunks):
+        return chunks
+    out: List[str] = []
+    for c in chunks:
+        if len(c) <= max_chars:
+            out.append(c)
+        else:
+            out.extend(p for p in (c[i : i + max_chars].strip() for i in range(0, len(c), max_chars)) if p)
+    return out
+
+
+def _chunk_hash(text: str) -> bytes:
+    # 128-bit key; switching hash backends only turns existing cache rows into misses
+    if blake3 is not None:
+        return blake3(text.encode("utf-8")).digest(length=16)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def new_job_id() -> str:
+    """Random 16-hex-char job id."""
+    if blake3 is not None:
+        return blake3(time.time_ns().to_bytes(8, "little") + os.urandom(8)).hexdigest(length=8)
+    return secrets.token_hex(8)
+
+
+def _lookup_cache(conn: sqlite3.Connection, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+    """Cached embeddings by hash, as packed int8 rows (float32 scale + int8 codes)."""
+    found: Dict[bytes, np.ndarray] = {}
+    step = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    for i in range(0, len(hashes), step):
+        part = hashes[i : i + step]
+        sql = f"SELECT hash, embedding, dtype FROM emb_cache WHERE hash IN ({', '.join('?' * len(part))})"
+        for h, blob, dtype in conn.execute(sql, part):
+            if dtype == "i8":
+                found[h] = np.frombuffer(blob, dtype=np.uint8)
+            else:
+                # Rows cached before the int8 format: quantized once here
+                found[h] = pack_int8(np.frombuffer(blob, dtype=np.float32)[None, :])[0]
+    return found
+
+
+def _insert_cache(conn: sqlite3.Connection, rows: List[Tuple[bytes, Any, int]]) -> None:
+    conn.executemany("INSERT OR IGNORE INTO emb_cache (hash, embedding, dim, dtype) VALUES (?, ?, ?, 'i8')", rows)
+
+
+def _embed_chunks(
+    chunks: List[str], batch_size: int | None = None, conn: sqlite3.Connection | None = None
+) -> Tuple[np.ndarray, int, List[Tuple[bytes, np.ndarray, int]]]:
+    """Embed chunks in a single encode call, skipping texts already in emb_cache.
+
+    Distinct uncached chunks are sorted by length first so each batch pads to
+    similar sizes. Returns (packed int8 matrix with one row per chunk in input
+    order, dim, new emb_cache rows); the new rows are left to the caller to
+    write on its own connection. Cache hits are already packed and are used
+    as stored.
+    """
+    if not chunks:
+        return np.empty((0, 0), dtype=np.uint8), 0, []
+    hashes = [_chunk_hash(c) for c in chunks]
+    cached = _lookup_cache(conn, list(set(hashes))) if conn is not None else {}
+
+    # Encode each distinct uncached text once
+    misses: Dict[bytes, int] = {}
+    for i, h in enumerate(hashes):
+        if h not in cached and h not in misses:
+            misses[h] = i
+    miss_idx = list(misses.values())
+    new_rows: List[Tuple[bytes, np.ndarray, int]] = []
+    if miss_idx:
+        model = _get_model()
+        batch_size = batch_size or embedding_batch_size(model)
+        lengths = np.fromiter((len(chunks[i]) for i in miss_idx), dtype=np.int64, count=len(miss_idx))
+        order = np.argsort(lengths, kind="stable")
+        vecs = model.encode(
+            [chunks[miss_idx[j]][:MAX_CHARS] for j in order],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            convert_to_tensor=False,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        packed = pack_int8(np.asarray(vecs, dtype=np.float32))
+        dim = packed.shape[1] - 4
+        for j, row in zip(order, packed):
+            h = hashes[miss_idx[j]]
+            cached[h] = row
+            # Row views bind as BLOBs without an intermediate bytes copy
+            new_rows.append((h, row, dim))
 
+    out = np.stack([cached[h] for h in hashes])
+    return out, int(out.shape[1]) - 4, new_rows
 
-def _update_job(job_id: str, **fields: Any) -> None:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+
+def _update_job(conn: sqlite3.Connection, job_id: str, **fields: Any) -> None:
     sets = ", ".join([f"{k} = ?" for k in fields.keys()])
     params = list(fields.values()) + [job_id]
-    cur.execute(f"UPDATE jobs SET {sets}, updated_at = ? WHERE id = ?", params[:-1] + [time.time()] + [job_id])
-    conn.commit()
-    conn.close()
+    conn.execute(f"UPDATE jobs SET {sets}, updated_at = ? WHERE id = ?", params[:-1] + [time.time()] + [job_id])
 
 
-def _insert_job(job_id: str, total_files: int) -> None:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+def _insert_job(conn: sqlite3.Connection, job_id: str, total_files: int, status: str = "running") -> None:
+    conn.execute(
         "INSERT OR REPLACE INTO jobs (id, status, total_files, processed_files, created_at, updated_at, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (job_id, "running", total_files, 0, time.time(), time.time(), None),
+        (job_id, status, total_files, 0, time.time(), time.time(), None),
     )
-    conn.commit()
-    conn.close()
 
 
-def _insert_document(job_id: str, filename: str, doc_type: str) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+def _insert_document(conn: sqlite3.Connection, job_id: str, filename: str, doc_type: str) -> int:
+    cur = conn.execute(
         "INSERT INTO documents (job_id, filename, doc_type) VALUES (?, ?, ?)",
         (job_id, filename, doc_type),
     )
-    doc_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return doc_id
+    return cur.lastrowid
 
 
-def _insert_chunks(document_id: int, chunks: List[str], embeddings: List[bytes], dim: int) -> None:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    rows = [(document_id, i, chunks[i], embeddings[i], dim) for i in range(len(chunks))]
-    cur.executemany(
-        "INSERT INTO chunks (document_id, chunk_index, text, embedding, dim) VALUES (?, ?, ?, ?, ?)",
-        rows,
-    )
-    conn.commit()
-    conn.close()
-
+def _insert_chunks(conn: sqlite3.Connection, document_id: int, chunks: List[str], embeddings: np.ndarray, dim: int) -> None:
+    """Insert chunks with multi-row VALUES statements of up to INSERT_GROUP_ROWS rows.
 
-def start_ingestion_job(job_id: str, files: List[Tuple[str, bytes, str | None]]) -> None:
-    """Process files sequentially; update job status; store embeddings in SQLite.
-    files: list of (filename, content_bytes, content_type)
+    embeddings is the packed int8 matrix from _embed_chunks (row i belongs to
+    chunks[i]); it is appended to the sidecar, which each row references by
+    vec_row, and is not duplicated into the embedding BLOB.
     """
-    init_storage()
-    _insert_job(job_id, total_files=len(files))
+    embeddings = np.ascontiguousarray(embeddings)
+    first_row = _append_sidecar(embeddings, dim) if chunks else 0
+    width = 6
+    values = "(" + ", ".join(["?"] * width) + ")"
+    # Stay under SQLite's host-parameter limit (999 on older builds)
+    max_rows = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) // width
+    group = max(1, min(INSERT_GROUP_ROWS, max_rows))
+    head = "INSERT INTO chunks (document_id, chunk_index, text, dim, dtype, vec_row) VALUES "
+    # Full-size groups share one SQL string, so sqlite3's statement cache reuses the prepared statement
+    full_sql = head + ", ".join([values] * group)
+    cur = conn.cursor()
+    for start in range(0, len(chunks), group):
+        n = min(group, len(chunks) - start)
+        sql = full_sql if n == group else head + ", ".join([values] * n)
+        params: List[Any] = []
+        for i in range(start, start + n):
+            params.extend((document_id, i, chunks[i], dim, "i8", first_row + i))
+        cur.execute(sql, params)
+        if _vec_available and dim == VEC_DIM:
+            # AUTOINCREMENT ids of one multi-row INSERT are consecutive
+            last_id = cur.lastrowid
+            vecs = dequantize_int8(embeddings[start : start + n])
+            cur.executemany(
+                "INSERT INTO chunks_vec (rowid, embedding) VALUES (?, ?)",
+                zip(range(last_id - n + 1, last_id + 1), vecs),
+            )
+
+
+def _extract_and_chunk(path: str, doc_type: str) -> List[str]:
+    """Worker-process stage: extract text and split it into chunks."""
+    chunks = dynamic_chunking(_extract_text(path, doc_type), doc_type)
+    # Safety: cap chunks to avoid extreme sizes
+    return chunks[:5000]
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline has been stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(body: Callable[..., None], args: Tuple[Any, ...], out_q: queue.Queue, stop: threading.Event) -> None:
+    """Thread target for a pipeline stage: whatever happens in body, the next
+    stage receives either _DONE or the error, so the writer never waits forever."""
+    try:
+        body(*args, out_q, stop)
+    except Exception as e:
+        _put(out_q, e, stop)
+    except BaseException as e:
+        _put(out_q, RuntimeError(f"pipeline stage {body.__name__} died: {e!r}"), stop)
+        raise
+    else:
+        _put(out_q, _DONE, stop)
+
+
+def _parse_stage(files: List[Tuple[str, str, str | None]], out_q: queue.Queue, stop: threading.Event) -> None:
+    """Extract + chunk files in a process pool, emitting documents as they finish."""
+    workers = max(1, min(len(files), (os.cpu_count() or 2) - 1))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = {}
+        for (filename, path, content_type) in files:
+            doc_type = _detect_doc_type(filename, content_type)
+            futures[pool.submit(_extract_and_chunk, path, doc_type)] = (filename, doc_type)
+        for fut in as_completed(futures):
+            filename, doc_type = futures[fut]
+            if not _put(out_q, (filename, doc_type, fut.result()), stop):
+                pool.shutdown(cancel_futures=True)
+                return
+
+
+def _embed_stage(in_q: queue.Queue, out_q: queue.Queue, stop: threading.Event) -> None:
+    """Merge parsed documents across files and embed them in large batches."""
+    # This thread's own connection for emb_cache lookups (WAL lets it read beside the writer)
+    _embed_loop(get_connection(), in_q, out_q, stop)
+
+
+def _embed_loop(conn: sqlite3.Connection, in_q: queue.Queue, out_q: queue.Queue, stop: threading.Event) -> None:
+    done = False
+    while not done and not stop.is_set():
+        try:
+            item = in_q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        batch: List[Tuple[str, str, List[str]]] = []
+        n_chunks = 0
+        # Greedily take whatever is already parsed, up to EMBED_BATCH_CHUNKS
+        while True:
+            if item is _DONE:
+                done = True
+                break
+            if isinstance(item, BaseException):
+                raise item
+            batch.append(item)
+            n_chunks += len(item[2])
+            if n_chunks >= EMBED_BATCH_CHUNKS:
+                break
+            try:
+                item = in_q.get_nowait()
+            except queue.Empty:
+                break
+        if not batch:
+            continue
+        embs, dim, cache_rows = _embed_chunks(
+            [c for _, _, chunks in batch for c in chunks], conn=conn
+        )
+        # Hand each document a row slice (a view) of the packed matrix; new cache rows
+        # travel with the first document of the batch
+        pos = 0
+        for filename, doc_type, chunks in batch:
+            n = len(chunks)
+            if not _put(out_q, (filename, doc_type, chunks, embs[pos : pos + n], dim, cache_rows), stop):
+                return
+            cache_rows = []
+            pos += n
+
+
+def start_ingestion_job(job_id: str, files: List[Tuple[str, str, str | None]]) -> None:
+    """Ingest files through a pipelined extract -> embed -> write flow.
+    files: list of (filename, spool_path, content_type); spool files are
+    deleted once the job finishes.
+
+    Extraction and chunking run in a process pool, a thread embeds documents
+    in merged batches as they arrive, and this thread writes them through its
+    connection. The write lock is only held while writing: each BEGIN
+    IMMEDIATE transaction covers the documents already queued (at most
+    PROGRESS_COMMIT_EVERY) and commits before waiting for more.
+    """
+    parsed: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+    embedded: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+    stop = threading.Event()
+    stages = [
+        threading.Thread(target=_run_stage, args=(_parse_stage, (files,), parsed, stop), daemon=True),
+        threading.Thread(target=_run_stage, args=(_embed_stage, (parsed,), embedded, stop), daemon=True),
+    ]
 
     processed = 0
     try:
-        for (filename, data, content_type) in files:
-            doc_type = _detect_doc_type(filename, content_type)
-            text = _extract_text(data, doc_type)
-            chunks = dynamic_chunking(text, doc_type)
-            if not chunks:
-                processed += 1
-                _update_job(job_id, processed_files=processed)
-                continue
-            # Safety: cap chunks to avoid extreme sizes
-            if len(chunks) > 5000:
-                chunks = chunks[:5000]
-            embs, dim = _embed_chunks(chunks, batch_size=64)
-            doc_id = _insert_document(job_id, filename, doc_type)
-            _insert_chunks(doc_id, chunks, embs, dim)
-            processed += 1
-            _update_job(job_id, processed_files=processed)
-
-        _update_job(job_id, status="completed")
+        # Inside the try: a failure here still marks the job failed and removes the spool files
+        init_storage()
+        conn = get_connection()
+        with _transaction(conn):
+            _insert_job(conn, job_id, total_files=len(files))
+        for t in stages:
+            t.start()
+        item: Any = None
+        done = False
+        while not done:
+            if item is None:
+                item = embedded.get()  # block with no transaction open
+            with _transaction(conn):
+                for _ in range(PROGRESS_COMMIT_EVERY):
+                    if item is _DONE:
+                        _update_job(conn, job_id, status="completed")
+                        done = True
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    filename, doc_type, chunks, embs, dim, cache_rows = item
+                    if cache_rows:
+                        _insert_cache(conn, cache_rows)
+                    if chunks:
+                        doc_id = _insert_document(conn, job_id, filename, doc_type)
+                        _insert_chunks(conn, doc_id, chunks, embs, dim)
+                    processed += 1
+                    _update_job(conn, job_id, processed_files=processed)
+                    try:
+                        item = embedded.get_nowait()
+                    except queue.Empty:
+                        item = None
+                        break
     except Exception as e:
-        _update_job(job_id, status="failed", error=str(e))
+        # If even this write fails, the error propagates to the executor future
+        with _transaction(get_connection()) as conn:
+            _update_job(conn, job_id, status="failed", error=str(e))
+    finally:
+        stop.set()
+        for t in stages:
+            if t.ident is not None:
+                t.join()
+        for (_, path, _) in files:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
 
 
 def create_job_record(job_id: str, total_files: int) -> None:
-    """Create a job row synchronously so clients can poll immediately."""
+    """Create a job row synchronously so clients can poll immediately.
+    It stays "queued" until the ingest worker starts the job."""
     init_storage()
-    _insert_job(job_id, total_files=total_files)
+    with _transaction(get_connection()) as conn:
+        _insert_job(conn, job_id, total_files=total_files, status="queued")
 
 
 def get_job_status(job_id: str) -> Dict[str, Any]:
     init_storage()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT id, status, total_files, processed_files, created_at, updated_at, error FROM jobs WHERE id = ?", (job_id,))
     row = cur.fetchone()
-    conn.close()
     if not row:
         return {"job_id": job_id, "status": "not_found"}
     return {
@@ -279,17 +829,20 @@ def get_job_status(job_id: str) -> Dict[str, Any]:
 
 
 def reset_ingestion() -> None:
-    """Destructively clear all ingestion data: jobs, documents, chunks."""
+    """Destructively clear all ingestion data: jobs, documents, chunks, embedding cache, sidecars."""
     init_storage()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    # Order matters due to FK from chunks -> documents
-    cur.execute("DELETE FROM chunks")
-    cur.execute("DELETE FROM documents")
-    cur.execute("DELETE FROM jobs")
-    conn.commit()
+    conn = get_connection()
+    with _transaction(conn):
+        cur = conn.cursor()
+        # Order matters due to FK from chunks -> documents
+        cur.execute("DELETE FROM chunks")
+        cur.execute("DELETE FROM documents")
+        cur.execute("DELETE FROM jobs")
+        cur.execute("DELETE FROM emb_cache")
+        if _vec_available:
+            cur.execute("DELETE FROM chunks_vec")
+    _remove_sidecars()
     try:
-        cur.execute("VACUUM")
+        conn.execute("VACUUM")
     except Exception:
         pass
-    conn.close()
@@ -7,42 +7,60 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
 import sqlite3
+import threading
 import time
-from collections import OrderedDict
-from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple
-
-from sqlalchemy import create_engine, text, inspect
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+from sqlalchemy import text, inspect
 from sqlalchemy.engine import Engine
-from sentence_transformers import SentenceTransformer
 import numpy as np
+from backend.nlp.embeddings import get_model
+from backend.nlp.quantize import decode_blobs, score_int8
+from backend.api.services.db_engines import get_engine
+from backend.api.services.document_processor import get_connection, load_vec_extension, open_sidecar
 try:
     from backend.nlp.intent_model import predict_intent as ml_predict_intent
 except Exception:  # fallback if sklearn missing at runtime
     ml_predict_intent = None
+try:
+    import ahocorasick
+except Exception:  # optional: single-pass keyword scan; regexes are used otherwise
+    ahocorasick = None
+try:
+    import orjson
+except Exception:  # optional: faster cache-key serialization; json is used otherwise
+    orjson = None
 
 
 STORAGE_DIR = os.path.join(os.getcwd(), "storage")
 INGEST_DB = os.path.join(STORAGE_DIR, "ingestion.db")
+# sqlite-vec caps k for a single KNN query
+VEC_MAX_K = 4096
 
 
 # ------------------------- Simple LRU Cache -------------------------
 class LRUCache:
     def __init__(self, capacity: int = 64):
         self.capacity = capacity
-        self._cache: OrderedDict[str, Any] = OrderedDict()
+        self._cache: OrderedDict[bytes, Any] = OrderedDict()
 
-    def get(self, key: str) -> Any:
+    def get(self, key: bytes) -> Any:
         if key not in self._cache:
             return None
         self._cache.move_to_end(key)
         return self._cache[key]
 
-    def set(self, key: str, value: Any) -> None:
+    def set(self, key: bytes, value: Any) -> None:
         if key in self._cache:
             self._cache.move_to_end(key)
         self._cache[key] = value
@@ -51,26 +69,40 @@ class LRUCache:
 
 
 _cache = LRUCache(capacity=100)
-_history: List[Dict[str, Any]] = []
-_model: SentenceTransformer | None = None
+
+
+def _cache_key(user_query: str, connection_string: str | None, limit: int) -> bytes:
+    fields = {"q": user_query, "cs": connection_string, "l": limit}
+    if orjson is not None:
+        raw = orjson.dumps(fields, option=orjson.OPT_SORT_KEYS)
+    else:
+        raw = json.dumps(fields, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+_history: deque[Dict[str, Any]] = deque(maxlen=100)
 
 # ------------------------- Metrics -------------------------
-_metrics = {
-    "total_queries": 0,
-    "cache_hits": 0,
-    "cache_misses": 0,
-    "exec_times": [],  # seconds list (trimmed)
-    "active_queries": 0,
-    "active_connections": 0,
-}
+@dataclass
+class Metrics:
+    total_queries: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    exec_times: deque[float] = field(default_factory=lambda: deque(maxlen=500))  # seconds, most recent 500
+    active_queries: int = 0
+    active_connections: int = 0
+
+
+_metrics = Metrics()
+# Serializes counter updates (read-modify-write); snapshots read without it
+_metrics_lock = threading.Lock()
 
 def _record_time(elapsed: float) -> None:
-    _metrics["exec_times"].append(elapsed)
-    if len(_metrics["exec_times"]) > 500:
-        del _metrics["exec_times"][:-500]
+    _metrics.exec_times.append(elapsed)
 
 def _inc(name: str, delta: int = 1) -> None:
-    _metrics[name] = _metrics.get(name, 0) + delta
+    with _metrics_lock:
+        setattr(_metrics, name, getattr(_metrics, name) + delta)
 
 def _with_active_query(fn, *args, **kwargs):
     _inc("active_queries", 1)
@@ -81,47 +113,139 @@ def _with_active_query(fn, *args, **kwargs):
 
 
 # ------------------------- Engine Pooling -------------------------
-_engine_cache: Dict[str, Engine] = {}
-
-
-def _get_engine(conn_str: str) -> Engine:
-    eng = _engine_cache.get(conn_str)
-    if eng is not None:
-        return eng
-    # SQLite needs special args for pooling/threading
-    connect_args = {}
-    if conn_str.startswith("sqlite:///"):
-        connect_args = {"check_same_thread": False}
-    eng = create_engine(
-        conn_str,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
-        future=True,
-        connect_args=connect_args,
-    )
-    _engine_cache[conn_str] = eng
-    return eng
+# Shared with schema discovery; see db_engines for pool sizing
+_get_engine = get_engine
+
+
+def _get_model() -> Any:
+    # Shared with ingestion: int8 ONNX Runtime on CPU when exported, else SentenceTransformer
+    return get_model()
+
+
+QUERY_ENCODE_BATCH = 32
+
+
+def _encode_queries(texts: Sequence[str]) -> np.ndarray:
+    model = _get_model()
+    return model.encode(
+        list(texts), batch_size=QUERY_ENCODE_BATCH, convert_to_numpy=True, normalize_embeddings=True
+    ).astype("float32", copy=False)
+
+
+class _PendingQuery:
+    __slots__ = ("text", "vec", "error", "lead", "ready")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.vec: np.ndarray | None = None
+        self.error: BaseException | None = None
+        self.lead = False
+        # Set once the vector (or error) is in, or when this caller is handed the next batch
+        self.ready = threading.Event()
+
+
+class _QueryEncoder:
+    """Coalesces concurrent single-query encodes into batched model calls.
+
+    A caller that finds the encoder idle encodes right away, so a lone query
+    costs the same as before. Queries arriving while an encode is running are
+    queued; when a batch finishes, the caller owning the oldest queued query
+    encodes the next batch (its own included). Every caller runs at most one
+    batch and returns with its own result, so none serves the queue forever.
+    """
+
+    def __init__(self, batch_size: int = QUERY_ENCODE_BATCH):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: List[_PendingQuery] = []
+        self._busy = False
+
+    def encode(self, text: str) -> np.ndarray:
+        item = _PendingQuery(text)
+        with self._lock:
+            self._pending.append(item)
+            if not self._busy:
+                self._busy = item.lead = True
+        if not item.lead:
+            item.ready.wait()
+        if item.lead:
+            self._run_batch()
+        if item.error is not None:
+            raise item.error
+        return item.vec
+
+    def _run_batch(self) -> None:
+        # The leader's query is the oldest pending one, so it is in this batch
+        with self._lock:
+            batch = self._pending[: self.batch_size]
+            del self._pending[: self.batch_size]
+        try:
+            vecs = _encode_queries([p.text for p in batch])
+        except Exception as e:
+            for p in batch:
+                p.error = e
+        except BaseException as e:
+            # The leader's thread is going down (KeyboardInterrupt, SystemExit); the
+            # rest of its batch still gets an answer, and the encoder moves on below
+            err = RuntimeError(f"query encoding interrupted: {e!r}")
+            for p in batch:
+                p.error = err
+            raise
+        else:
+            for p, vec in zip(batch, vecs):
+                p.vec = vec
+        finally:
+            for p in batch:
+                p.lead = False
+                p.ready.set()
+            # Hand the encoder to the oldest waiter (or go idle) rather than draining the queue
+            with self._lock:
+                if self._pending:
+                    nxt = self._pending[0]
+                    nxt.lead = True
+                    nxt.ready.set()
+                else:
+                    self._busy = False
+
 
+_query_encoder = _QueryEncoder()
 
-def _get_model() -> SentenceTransformer:
-    global _model
-    if _model is None:
-        _model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    return _model
+# Runs the document branch of hybrid queries alongside the SQL branch
+_exec = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid")
 
 
 # ------------------------- Classifier -------------------------
+_SQL_KEYS = ("employee", "employees", "department", "dept", "hired", "salary", "role", "position")
+_DOC_KEYS = ("resume", "document", "pdf", "contract", "clause", "policy", "termination")
+# Common skill/role tokens count as SQL intent too (since mapped to columns)
+_SKILL_ROLE_WORDS = ("python", "javascript", "sql", "nlp", "ml", "developer", "engineer", "manager")
+# All query-time patterns are compiled once at import
+# Fallback classifier scan: sql/doc keys match as substrings, skill/role words as whole words.
+# The zero-width lookahead lets finditer report overlapping hits, as the separate checks did.
+_RE_CLASSIFY = re.compile(
+    r"(?=(?P<sql>" + "|".join(_SQL_KEYS) + r"|\b(?:" + "|".join(_SKILL_ROLE_WORDS) + r")\b)"
+    r"|(?P<doc>" + "|".join(_DOC_KEYS) + r"))"
+)
+
+
+@lru_cache(maxsize=1024)
 def _classify(query: str) -> str:
     q = query.lower()
-    sql_keys = ["employee", "employees", "department", "dept", "hired", "salary", "role", "position"]
-    doc_keys = ["resume", "document", "pdf", "contract", "clause", "policy", "termination"]
-
-    # Treat common skill/role tokens as SQL intent too (since mapped to columns)
-    skill_role_signals = re.findall(r"\b(python|javascript|sql|nlp|ml|developer|engineer|manager)\b", q)
-
-    has_sql = any(k in q for k in sql_keys) or bool(skill_role_signals)
-    has_doc = any(k in q for k in doc_keys)
+    has_sql = has_doc = False
+    if _KEYWORDS is not None:
+        for end, (n, tags) in _KEYWORDS.iter(q):
+            if "sql" in tags or ("signal" in tags and _whole_word(q, end + 1 - n, end + 1)):
+                has_sql = True
+            if "doc" in tags:
+                has_doc = True
+    else:
+        for m in _RE_CLASSIFY.finditer(q):
+            if m.lastgroup == "sql":
+                has_sql = True
+            else:
+                has_doc = True
+            if has_sql and has_doc:
+                break
     if has_sql and has_doc:
         return "hybrid"
     if has_sql:
@@ -133,65 +257,151 @@ def _classify(query: str) -> str:
 
 
 # ------------------------- SQL Generation -------------------------
-def _normalize_tokens(query: str) -> str:
-    q = query.lower()
-    synonyms = {
-        "dept": "department",
-        "division": "department",
-        "compensation": "salary",
-        "pay": "salary",
-        "staff": "employees",
-        "emp": "employees",
-        "departements": "departments",
-    }
-    for k, v in synonyms.items():
-        q = re.sub(rf"\b{k}\b", v, q)
-    return q
+_SYNONYMS = {
+    "dept": "department",
+    "division": "department",
+    "compensation": "salary",
+    "pay": "salary",
+    "staff": "employees",
+    "emp": "employees",
+    "departements": "departments",
+}
+# One pass for all synonyms; no replacement is itself a synonym key
+_RE_SYN = re.compile(r"\b(" + "|".join(map(re.escape, _SYNONYMS)) + r")\b")
+
+_RE_INTENT_COUNT = re.compile(r"\b(how many|count|number of)\b")
+_RE_AVERAGE_SALARY = re.compile(r"\baverage\s+salary\b")
+_RE_DEPARTMENT = re.compile(r"\bdepartment\b")
+_RE_TOP_N = re.compile(r"\btop\s*\d+\b")
+_RE_EACH_DEPARTMENT = re.compile(r"\b(each\s+department|per\s+department)\b")
+_RE_EMAIL_HINT = re.compile(r"email\s*[:=]")
+_RE_ID_HINT = re.compile(r"\bid\s*[:=]?\s*\d+\b")
+_RE_WHICH_EMPLOYEE = re.compile(r"\bwhich\s+employee\b")
+
+_RE_THIS_YEAR = re.compile(r"\bthis year\b")
+_RE_HIRED_IN = re.compile(r"hired\s+(?:in|on)\s+(\d{4})")
+_RE_HIRED_AFTER = re.compile(r"hired\s+(?:after|since)\s+(\d{4})")
+_RE_HIRED_BEFORE = re.compile(r"hired\s+before\s+(\d{4})")
+_RE_HIRED_BETWEEN = re.compile(r"hired\s+between\s+(\d{4})\s+and\s+(\d{4})")
+_RE_SKILLS = re.compile(r"\b(python|java|javascript|sql|nlp|ml|react|django|postgresql)\b")
+_RE_REPORTS_TO = re.compile(r"reports\s+to\s+(?:'|\")?([a-zA-Z]+(?:\s+[a-zA-Z]+)+)(?:'|\")?")
+_RE_EMP_ID = re.compile(r"\bemp_id\s*=?\s*(\d+)\b")
+_RE_ID = re.compile(r"\bid\s*=?\s*(\d+)\b")
+_RE_EMAIL = re.compile(r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+_RE_MISSING_EMAIL = re.compile(r"\b(no|missing|empty)\s+emails?\b")
+# Per-field "missing" phrasings, each alternative folded into one pattern
+_MISSING_FIELDS = [
+    (re.compile(r"\b(no|missing|empty)\s+name\b|without\s+name"), "NAME_IS_MISSING"),
+    (re.compile(r"\b(no|missing|empty)\s+skills?\b|without\s+skills?"), "SKILLS_IS_MISSING"),
+    (re.compile(r"\b(no|missing|empty)\s+departments?\b|without\s+department"), "DEPARTMENT_IS_MISSING"),
+    (re.compile(r"\b(no|missing|empty)\s+positions?\b|without\s+position"), "POSITION_IS_MISSING"),
+    (re.compile(r"\b(no|missing|empty)\s+salary\b|without\s+salary"), "SALARY_IS_MISSING"),
+    (re.compile(r"\b(no|missing|empty)\s+(hire|join)\s+date\b|without\s+(hire|join)\s+date"), "HIRE_DATE_IS_MISSING"),
+    (re.compile(r"\b(no|missing|empty)\s+reports?\s*to\b|without\s+manager|without\s+reports?\s*to"), "REPORTS_TO_IS_MISSING"),
+]
+_RE_DEPT_NAME = re.compile(r"department\s+(?:is\s+)?(?:'|\")?([a-zA-Z]+)(?:'|\")?")
+_RE_POSITION_KW = re.compile(r"\b(senior|junior|developer|engineer|manager|full\s*stack|marketing|hr)\b")
+_RE_NAME_LIKE = re.compile(r"\b(?:show\s+me|find|employee(?:\s+named)?)\s+(?:'|\")?([a-zA-Z]+(?:\s+[a-zA-Z]+)?)(?:'|\")?\b")
+
+
+def _whole_word(q: str, start: int, end: int) -> bool:
+    """True when q[start:end] sits between regex word boundaries."""
+    before = q[start - 1] if start > 0 else " "
+    after = q[end] if end < len(q) else " "
+    return not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_")
+
+
+def _build_keyword_automaton() -> Any:
+    """One Aho-Corasick automaton over every classifier keyword and synonym.
+
+    Values are (keyword length, tags): 'sql'/'doc' match as substrings,
+    'signal'/'syn' only as whole words (checked by the caller).
+    """
+    tags: Dict[str, List[str]] = {}
+    for words, tag in ((_SQL_KEYS, "sql"), (_DOC_KEYS, "doc"), (_SKILL_ROLE_WORDS, "signal"), (_SYNONYMS, "syn")):
+        for w in words:
+            tags.setdefault(w, []).append(tag)
+    automaton = ahocorasick.Automaton()
+    for w, t in tags.items():
+        automaton.add_word(w, (len(w), frozenset(t)))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORDS = _build_keyword_automaton() if ahocorasick is not None else None
 
 
+@lru_cache(maxsize=1024)
+def _normalize_tokens(query: str) -> str:
+    q = query.lower()
+    if _KEYWORDS is None:
+        return _RE_SYN.sub(lambda m: _SYNONYMS[m.group(1)], q)
+    # Whole-word hits cannot overlap, so rewrites splice in left to right
+    parts: List[str] = []
+    pos = 0
+    for end, (n, tags) in _KEYWORDS.iter(q):
+        start = end + 1 - n
+        if "syn" in tags and _whole_word(q, start, end + 1):
+            parts.append(q[pos:start])
+            parts.append(_SYNONYMS[q[start : end + 1]])
+            pos = end + 1
+    if not parts:
+        return q
+    parts.append(q[pos:])
+    return "".join(parts)
+
+
+@lru_cache(maxsize=1024)
 def _infer_intent(q: str) -> str:
     """Rudimentary intent detection to shape SQL.
     Returns one of: 'count', 'avg_by_dept', 'top_paid_each_dept', 'find_one', 'select'
     """
-    if re.search(r"\b(how many|count|number of)\b", q):
+    if _RE_INTENT_COUNT.search(q):
         return "count"
-    if re.search(r"\baverage\s+salary\b", q) and re.search(r"\bdepartment\b", q):
+    if _RE_AVERAGE_SALARY.search(q) and _RE_DEPARTMENT.search(q):
         return "avg_by_dept"
-    if re.search(r"\btop\s*\d+\b", q) and re.search(r"\b(each\s+department|per\s+department)\b", q):
+    if _RE_TOP_N.search(q) and _RE_EACH_DEPARTMENT.search(q):
         return "top_paid_each_dept"
     # exact entity hints (email/id)
-    if re.search(r"email\s*[:=]", q) or re.search(r"\bid\s*[:=]?\s*\d+\b", q) or re.search(r"\bwhich\s+employee\b", q):
+    if _RE_EMAIL_HINT.search(q) or _RE_ID_HINT.search(q) or _RE_WHICH_EMPLOYEE.search(q):
         return "find_one"
     return "select"
 
 
 def _infer_filters(q: str) -> Tuple[str, Dict[str, Any]]:
+    # Memoized per query; hand out a fresh params dict since _run_sql adds paging keys to it
+    where, items = _parse_filters(q)
+    return where, dict(items)
+
+
+@lru_cache(maxsize=1024)
+def _parse_filters(q: str) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
     where = []
     params: Dict[str, Any] = {}
 
     # --- Hire date filters ---
     # this year
-    if "hired this year" in q or re.search(r"\bthis year\b", q):
+    if "hired this year" in q or _RE_THIS_YEAR.search(q):
         where.append("strftime('%Y', E_HIRE_COL) = strftime('%Y', 'now')")
 
     # explicit year: hired in 2024
-    my = re.search(r"hired\s+(?:in|on)\s+(\d{4})", q)
+    my = _RE_HIRED_IN.search(q)
     if my:
         params["year_in"] = my.group(1)
         where.append("strftime('%Y', E_HIRE_COL) = :year_in")
 
     # ranges: after/since, before, between
-    my_after = re.search(r"hired\s+(?:after|since)\s+(\d{4})", q)
+    my_after = _RE_HIRED_AFTER.search(q)
     if my_after:
         params["year_after"] = my_after.group(1)
         where.append("strftime('%Y', E_HIRE_COL) > :year_after")
 
-    my_before = re.search(r"hired\s+before\s+(\d{4})", q)
+    my_before = _RE_HIRED_BEFORE.search(q)
     if my_before:
         params["year_before"] = my_before.group(1)
         where.append("strftime('%Y', E_HIRE_COL) < :year_before")
 
-    my_between = re.search(r"hired\s+between\s+(\d{4})\s+and\s+(\d{4})", q)
+    my_between = _RE_HIRED_BETWEEN.search(q)
     if my_between:
         y1, y2 = my_between.group(1), my_between.group(2)
         params["year_b1"], params["year_b2"] = y1, y2
@@ -199,7 +409,7 @@ def _infer_filters(q: str) -> Tuple[str, Dict[str, Any]]:
 
     # --- Skills (allow multiple keywords) ---
     # Match tokens against both skills text and position/title to be forgiving.
-    skills = re.findall(r"\b(python|java|javascript|sql|nlp|ml|react|django|postgresql)\b", q)
+    skills = _RE_SKILLS.findall(q)
     for i, sk in enumerate(skills):
         key = f"skill_kw_{i}"
         params[key] = f"%{sk}%"
@@ -208,71 +418,43 @@ def _infer_filters(q: str) -> Tuple[str, Dict[str, Any]]:
 
     # --- Reports-to (manager) exact match ---
     # Matches: who reports to John Smith, reports to "John Smith"
-    mrep = re.search(r"reports\s+to\s+(?:'|\")?([a-zA-Z]+(?:\s+[a-zA-Z]+)+)(?:'|\")?", q)
+    mrep = _RE_REPORTS_TO.search(q)
     if mrep:
         params["reports_to_name"] = mrep.group(1).strip()
         # Use equality on lowercase for robustness
         where.append("lower(e.reports_to) = lower(:reports_to_name)")
 
     # --- Exact ID lookup (emp_id or id) ---
-    mid = re.search(r"\bemp_id\s*=?\s*(\d+)\b", q) or re.search(r"\bid\s*=?\s*(\d+)\b", q)
+    mid = _RE_EMP_ID.search(q) or _RE_ID.search(q)
     if mid:
         params["id_exact"] = int(mid.group(1))
         where.append("E_ID_COL = :id_exact")
 
     # --- Exact email lookup ---
-    memail = re.search(r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})", q)
+    memail = _RE_EMAIL.search(q)
     if memail:
         params["email_exact"] = memail.group(1)
         where.append("lower(E_EMAIL_COL) = lower(:email_exact)")
 
     # --- Missing/empty email filter ---
-    if (
-        re.search(r"\b(no|missing|empty)\s+emails?\b", q)
-        or re.search(r"\b(no|missing|empty)\s+email\b", q)
-        or "without email" in q
-    ):
+    if _RE_MISSING_EMAIL.search(q) or "without email" in q:
         # Use a placeholder to resolve after schema detection
         where.append("EMAIL_IS_MISSING")
 
     # --- Generic missing filters for other common fields ---
-    def _has_missing(patterns: List[str]) -> bool:
-        for pat in patterns:
-            if re.search(pat, q):
-                return True
-        return False
-
-    # name
-    if _has_missing([r"\b(no|missing|empty)\s+name\b", r"without\s+name"]):
-        where.append("NAME_IS_MISSING")
-    # skills
-    if _has_missing([r"\b(no|missing|empty)\s+skills?\b", r"without\s+skills?"]):
-        where.append("SKILLS_IS_MISSING")
-    # department
-    if _has_missing([r"\b(no|missing|empty)\s+departments?\b", r"\b(no|missing|empty)\s+department\b", r"without\s+department"]):
-        where.append("DEPARTMENT_IS_MISSING")
-    # position
-    if _has_missing([r"\b(no|missing|empty)\s+positions?\b", r"\b(no|missing|empty)\s+position\b", r"without\s+position"]):
-        where.append("POSITION_IS_MISSING")
-    # salary
-    if _has_missing([r"\b(no|missing|empty)\s+salary\b", r"without\s+salary"]):
-        where.append("SALARY_IS_MISSING")
-    # hire date
-    if _has_missing([r"\b(no|missing|empty)\s+(hire|join)\s+date\b", r"without\s+(hire|join)\s+date"]):
-        where.append("HIRE_DATE_IS_MISSING")
-    # reports_to
-    if _has_missing([r"\b(no|missing|empty)\s+reports?\s*to\b", r"without\s+manager", r"without\s+reports?\s*to"]):
-        where.append("REPORTS_TO_IS_MISSING")
+    for pattern, placeholder in _MISSING_FIELDS:
+        if pattern.search(q):
+            where.append(placeholder)
 
     # --- Department name (word or quoted) ---
-    md = re.search(r"department\s+(?:is\s+)?(?:'|\")?([a-zA-Z]+)(?:'|\")?", q)
+    md = _RE_DEPT_NAME.search(q)
     if md:
         params["dept_kw"] = f"%{md.group(1)}%"
         where.append("d.name LIKE :dept_kw")
 
     # --- Position keywords (simple substring on e.position) ---
     # Note: DO NOT include language tokens like 'python' here; they belong to skills filter.
-    pos = re.findall(r"\b(senior|junior|developer|engineer|manager|full\s*stack|marketing|hr)\b", q)
+    pos = _RE_POSITION_KW.findall(q)
     if pos:
         # Combine into one LIKE with ORs for compactness
         like_clauses = []
@@ -284,26 +466,45 @@ def _infer_filters(q: str) -> Tuple[str, Dict[str, Any]]:
 
     # --- Name like filter (handles queries such as 'show me John') ---
     # Only apply a simple substring match on the employee name column
-    mname = re.search(r"\b(?:show\s+me|find|employee(?:\s+named)?)\s+(?:'|\")?([a-zA-Z]+(?:\s+[a-zA-Z]+)?)(?:'|\")?\b", q)
+    mname = _RE_NAME_LIKE.search(q)
     if mname:
         n = mname.group(1).strip()
         if n and len(n) >= 2:  # avoid single-letter noise
             params["name_like"] = f"%{n}%"
             where.append("E_NAME_COL LIKE :name_like")
 
-    return (" AND ".join(where) if where else "", params)
+    return (" AND ".join(where) if where else "", tuple(params.items()))
+
+
+# Schema mapping + table names per engine; schemas rarely change, so re-inspect at most every TTL
+SCHEMA_TTL_SEC = 300.0
+_schema_cache: Dict[int, Tuple[float, Dict[str, Any], Set[str]]] = {}
+
+
+def _schema_info(engine: Engine) -> Tuple[Dict[str, Any], Set[str]]:
+    """(schema mapping, table names) for engine, cached by id(engine) for SCHEMA_TTL_SEC."""
+    now = time.monotonic()
+    hit = _schema_cache.get(id(engine))
+    if hit is not None and now - hit[0] < SCHEMA_TTL_SEC:
+        return hit[1], hit[2]
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    mapping = _map_schema(insp, tables)
+    _schema_cache[id(engine)] = (now, mapping, tables)
+    return mapping, tables
 
 
 def _detect_schema(engine: Engine) -> Dict[str, Any]:
+    return _schema_info(engine)[0]
+
+
+def _map_schema(insp: Any, tables: Set[str]) -> Dict[str, Any]:
     """Detects which table/column naming variant is present and returns a mapping.
     Supports:
       - employees/departments
       - staff/documents
       - personnel/divisions
     """
-    insp = inspect(engine)
-    tables = set(insp.get_table_names())
-
     # default mapping shape
     mapping = {
         "emp_table": "employees",
@@ -385,12 +586,42 @@ def _detect_schema(engine: Engine) -> Dict[str, Any]:
     return mapping  # fallback to employees/departments
 
 
-def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, offset: int = 0, intent: str = "select") -> Dict[str, Any]:
+# Entity keywords mapped to the table they need
+_ENTITY_TABLES = [
+    (re.compile(r"\bcontractors\b"), "contractors"),
+    (re.compile(r"\bvendor\b"), "vendors"),
+    (re.compile(r"\bvendors\b"), "vendors"),
+    (re.compile(r"\bintern\b"), "interns"),
+    (re.compile(r"\binterns\b"), "interns"),
+    (re.compile(r"\bproject\b"), "projects"),
+    (re.compile(r"\bprojects\b"), "projects"),
+]
+_RE_DEPARTMENTS = re.compile(r"\bdepartments?\b")
+_RE_EMPLOYEES = re.compile(r"\bemployees?\b")
+_RE_FROM_DEPARTMENTS = re.compile(r"\bFROM\s+departments\b")
+_RE_TOP_N_VALUE = re.compile(r"top\s*(\d+)")
+# Column / missing-value placeholders emitted by _infer_filters (D_NAME_COL is resolved per query shape)
+_PLACEHOLDER_RE = re.compile(
+    r"\be\.salary_col\b|\bE_(?:ID|NAME|EMAIL|SKILLS|HIRE)_COL\b"
+    r"|\b(?:EMAIL|NAME|SKILLS|DEPARTMENT|POSITION|SALARY|HIRE_DATE|REPORTS_TO)_IS_MISSING\b"
+)
+
+
+def _run_sql(
+    query_text: str,
+    connection_string: str | None,
+    limit: int = 50,
+    offset: int = 0,
+    intent: str = "select",
+    qn: str | None = None,
+) -> Dict[str, Any]:
+    """qn: query_text already passed through _normalize_tokens, when the caller has it."""
     # Fallback to local SQLite example if no connection string provided
     conn_str = connection_string or f"sqlite:///{os.path.join(os.getcwd(), 'example.db')}"
     engine = _get_engine(conn_str)
 
-    qn = _normalize_tokens(query_text)
+    if qn is None:
+        qn = _normalize_tokens(query_text)
     where, params = _infer_filters(qn)
     # Use ML intent model when available; fallback to rules
     ml_intent = None
@@ -421,22 +652,9 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
     col_reports = e.get("reports_to") or "reports_to"
 
     # Missing/unknown-entity handling
-    try:
-        insp_tables = set(inspect(engine).get_table_names())
-    except Exception:
-        insp_tables = set()
-    # Map entity keywords to expected table names
-    entity_tables = {
-        "contractors": "contractors",
-        "vendor": "vendors",
-        "vendors": "vendors",
-        "intern": "interns",
-        "interns": "interns",
-        "project": "projects",
-        "projects": "projects",
-    }
-    for kw, table in entity_tables.items():
-        if re.search(rf"\b{kw}\b", qn) and table not in insp_tables:
+    insp_tables = _schema_info(engine)[1]
+    for pattern, table in _ENTITY_TABLES:
+        if pattern.search(qn) and table not in insp_tables:
             return {
                 "type": "sql",
                 "sql": None,
@@ -446,17 +664,8 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
                 "pagination": None,
             }
 
-    # Replace placeholder columns for filters if present
-    if "e.salary_col" in (where or ""):
-        where = where.replace("e.salary_col", f"e.{col_sal}")
-    if "E_HIRE_COL" in (where or ""):
-        hire_col = col_hire or "join_date"
-        where = where.replace("E_HIRE_COL", f"e.{hire_col}")
-    if "E_ID_COL" in (where or ""):
-        where = where.replace("E_ID_COL", f"e.{col_id}")
-    if "E_EMAIL_COL" in (where or "") and col_email:
-        where = where.replace("E_EMAIL_COL", f"e.{col_email}")
-    elif "E_EMAIL_COL" in (where or "") and not col_email:
+    # Placeholders that cannot be resolved against this schema end the query early
+    if col_email is None and "E_EMAIL_COL" in where:
         # Email lookup requested but email column not present: return error
         return {
             "type": "sql",
@@ -466,59 +675,39 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
             "error": "error: not present in your database (email column missing)",
             "pagination": None,
         }
-    if "E_NAME_COL" in (where or ""):
-        where = where.replace("E_NAME_COL", f"e.{col_name}")
-    if "E_SKILLS_COL" in (where or ""):
-        if col_skills:
-            where = where.replace("E_SKILLS_COL", f"e.{col_skills}")
-        else:
-            # No skills column; drop skills side of the OR safely
-            where = where.replace("E_SKILLS_COL LIKE", "0 /* no skills col */ LIKE")
-
-    # Resolve missing email placeholder
-    if "EMAIL_IS_MISSING" in (where or ""):
-        if col_email:
-            where = where.replace("EMAIL_IS_MISSING", f"(e.{col_email} IS NULL OR e.{col_email} = '')")
-        else:
-            # No email column available; return empty result with warning
-            return {
-                "type": "sql",
-                "sql": None,
-                "params": {},
-                "rows": [],
-                "warning": "Email column not present; cannot filter for missing email.",
-                "pagination": None,
-            }
+    if col_email is None and "EMAIL_IS_MISSING" in where:
+        # No email column available; return empty result with warning
+        return {
+            "type": "sql",
+            "sql": None,
+            "params": {},
+            "rows": [],
+            "warning": "Email column not present; cannot filter for missing email.",
+            "pagination": None,
+        }
 
-    # Resolve other missing placeholders based on schema
-    if "NAME_IS_MISSING" in (where or ""):
-        where = where.replace("NAME_IS_MISSING", f"(e.{col_name} IS NULL OR e.{col_name} = '')")
-    if "SKILLS_IS_MISSING" in (where or ""):
-        if col_skills:
-            where = where.replace("SKILLS_IS_MISSING", f"(e.{col_skills} IS NULL OR e.{col_skills} = '')")
-        else:
-            where = where.replace("SKILLS_IS_MISSING", "1=0")
-    if "DEPARTMENT_IS_MISSING" in (where or ""):
-        # consider missing as no department FK
-        if col_deptfk:
-            where = where.replace("DEPARTMENT_IS_MISSING", f"(e.{col_deptfk} IS NULL)")
-        else:
-            where = where.replace("DEPARTMENT_IS_MISSING", "1=0")
-    if "POSITION_IS_MISSING" in (where or ""):
-        if col_pos:
-            where = where.replace("POSITION_IS_MISSING", f"(e.{col_pos} IS NULL OR e.{col_pos} = '')")
-        else:
-            where = where.replace("POSITION_IS_MISSING", "1=0")
-    if "SALARY_IS_MISSING" in (where or ""):
-        where = where.replace("SALARY_IS_MISSING", f"(e.{col_sal} IS NULL)")
-    if "HIRE_DATE_IS_MISSING" in (where or ""):
+    # Resolve all column / missing-value placeholders in one pass
+    if where:
         hire_col = col_hire or "join_date"
-        where = where.replace("HIRE_DATE_IS_MISSING", f"(e.{hire_col} IS NULL OR e.{hire_col} = '')")
-    if "REPORTS_TO_IS_MISSING" in (where or ""):
-        if col_reports:
-            where = where.replace("REPORTS_TO_IS_MISSING", f"(e.{col_reports} IS NULL OR e.{col_reports} = '')")
-        else:
-            where = where.replace("REPORTS_TO_IS_MISSING", "1=0")
+        subs = {
+            "e.salary_col": f"e.{col_sal}",
+            "E_HIRE_COL": f"e.{hire_col}",
+            "E_ID_COL": f"e.{col_id}",
+            "E_EMAIL_COL": f"e.{col_email}",
+            "E_NAME_COL": f"e.{col_name}",
+            # No skills column; drop skills side of the OR safely
+            "E_SKILLS_COL": f"e.{col_skills}" if col_skills else "0 /* no skills col */",
+            "EMAIL_IS_MISSING": f"(e.{col_email} IS NULL OR e.{col_email} = '')",
+            "NAME_IS_MISSING": f"(e.{col_name} IS NULL OR e.{col_name} = '')",
+            "SKILLS_IS_MISSING": f"(e.{col_skills} IS NULL OR e.{col_skills} = '')" if col_skills else "1=0",
+            # consider missing department as no department FK
+            "DEPARTMENT_IS_MISSING": f"(e.{col_deptfk} IS NULL)" if col_deptfk else "1=0",
+            "POSITION_IS_MISSING": f"(e.{col_pos} IS NULL OR e.{col_pos} = '')" if col_pos else "1=0",
+            "SALARY_IS_MISSING": f"(e.{col_sal} IS NULL)",
+            "HIRE_DATE_IS_MISSING": f"(e.{hire_col} IS NULL OR e.{hire_col} = '')",
+            "REPORTS_TO_IS_MISSING": f"(e.{col_reports} IS NULL OR e.{col_reports} = '')" if col_reports else "1=0",
+        }
+        where = _PLACEHOLDER_RE.sub(lambda m: subs[m.group(0)], where)
 
     # Build base FROM/JOIN with schema mapping
     # Deduplicate by email if email exists
@@ -542,7 +731,7 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
         + dept_join
     )
     # Support direct departments listing queries
-    if re.search(r"\bdepartments?\b", qn) and not re.search(r"\bemployees?\b", qn):
+    if _RE_DEPARTMENTS.search(qn) and not _RE_EMPLOYEES.search(qn):
         # Simple departments table listing
         dname = d["name"] if d else "dept_name"
         did = d["id"] if d else "dept_id"
@@ -556,7 +745,7 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
         params["offset"] = max(0, int(offset))
     else:
         sql = base
-    if where and not re.search(r"\bFROM\s+departments\b", sql):
+    if where and not _RE_FROM_DEPARTMENTS.search(sql):
         # If WHERE contains department name placeholder, patch it
         if "D_NAME_COL" in where and dt and d:
             where = where.replace("D_NAME_COL", f"d.{d['name']}")
@@ -583,7 +772,7 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
         if where:
             part += f" WHERE {where}"
         # try to extract top N
-        mtop = re.search(r"top\s*(\d+)", qn)
+        mtop = _RE_TOP_N_VALUE.search(qn)
         topn = int(mtop.group(1)) if mtop else 5
         sql = f"SELECT * FROM ( {part} ) z WHERE z.rn <= :topn ORDER BY z.department, z.salary DESC"
         params["topn"] = topn
@@ -592,8 +781,11 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
         # Already handled earlier for departments direct listing; nothing to change
         count_sql = None
     else:
-        # total count (without limit/offset)
+        # total count (without limit/offset); only run when the page itself can't carry it
         count_sql = f"SELECT COUNT(1) AS total FROM ({sql}) t"
+        # COUNT(*) OVER() is evaluated before LIMIT, so every row carries the full total
+        select_head = f"SELECT {', '.join(select_cols)} "
+        sql = sql.replace(select_head, f"SELECT {', '.join(select_cols)}, COUNT(*) OVER() AS __total ", 1)
         # limit/offset and default ordering (ascending)
         order_col = col_id
         sql += f" ORDER BY e.{order_col} ASC LIMIT :limit OFFSET :offset"
@@ -604,10 +796,22 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
         _inc("active_connections", 1)
         try:
             total = None
+            result = conn.execute(text(sql), params)
+            keys = list(result.keys())
+            rows = result.all()
+            has_total = bool(keys) and keys[-1] == "__total"
+            if has_total:
+                keys.pop()  # zip() below then stops before the trailing __total value
+            # Build each row dict once, straight from the row tuples
+            data = [dict(zip(keys, r)) for r in rows]
             if count_sql:
-                total = conn.execute(text(count_sql), params).scalar_one()
-            rows = conn.execute(text(sql), params).mappings().all()
-            data = [dict(r) for r in rows]
+                if rows and has_total:
+                    total = rows[0][-1]
+                elif not rows and params["offset"] == 0:
+                    total = 0
+                else:
+                    # Page past the end (no row to read the total from)
+                    total = conn.execute(text(count_sql), params).scalar_one()
         finally:
             _inc("active_connections", -1)
     return {
@@ -620,32 +824,188 @@ def _run_sql(query_text: str, connection_string: str | None, limit: int = 50, of
 
 
 # ------------------------- Document Search -------------------------
-def _search_documents(query_text: str, top_k: int = 8, offset: int = 0) -> Dict[str, Any]:
-    if not os.path.exists(INGEST_DB):
-        return {"type": "document", "results": []}
-    model = _get_model()
-    q_vec = model.encode([query_text], convert_to_numpy=True, normalize_embeddings=True).astype("float32")[0]
+# Rows per fetchmany() when loading the scan index
+FETCH_ROWS = 4096
+
+
+def _search_vec(conn: sqlite3.Connection, q_vec: np.ndarray, start: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """KNN over the sqlite-vec chunks_vec index (cosine distance)."""
+    total = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    hits = conn.execute(
+        "SELECT rowid, distance FROM chunks_vec WHERE embedding MATCH ? AND k = ?",
+        (q_vec.tobytes(), start + limit),
+    ).fetchall()[start:]
+    if not hits:
+        return [], total
+    ids = [h[0] for h in hits]
+    meta = {
+        row[0]: row[1:]
+        for row in conn.execute(
+            f"SELECT c.id, c.text, d.filename, d.doc_type FROM chunks c JOIN documents d ON c.document_id = d.id WHERE c.id IN ({', '.join('?' * len(ids))})",
+            ids,
+        )
+    }
+    page: List[Dict[str, Any]] = []
+    for chunk_id, distance in hits:
+        if chunk_id not in meta:
+            continue
+        text_chunk, filename, doc_type = meta[chunk_id]
+        score = 1.0 - float(distance)
+        page.append({"text": text_chunk, "filename": filename, "doc_type": doc_type, "score": score})
+    return page, total
+
 
-    conn = sqlite3.connect(INGEST_DB)
+# Decoded chunk matrix + metadata for the full scan, reused until ingestion.db changes
+_doc_index: Dict[str, Any] | None = None
+_doc_index_lock = threading.Lock()
+
+
+def _ingest_db_stamp() -> Tuple[Any, ...]:
+    """(mtime_ns, size) of ingestion.db and its WAL; commits land in the WAL first."""
+    stamp = []
+    for path in (INGEST_DB, INGEST_DB + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _get_doc_index(conn: sqlite3.Connection, dim: int) -> Dict[str, Any]:
+    global _doc_index
+    # Stamp before loading: a write racing the load makes the next call reload
+    stamp = (_ingest_db_stamp(), dim)
+    index = _doc_index
+    if index is not None and index["stamp"] == stamp:
+        return index
+    with _doc_index_lock:
+        if _doc_index is None or _doc_index["stamp"] != stamp:
+            _doc_index = _load_doc_index(conn, dim)
+            _doc_index["stamp"] = stamp
+        return _doc_index
+
+
+def _load_doc_index(conn: sqlite3.Connection, dim: int) -> Dict[str, Any]:
+    """Load every chunk of width `dim` as int8 codes + scales plus per-column metadata.
+
+    Embeddings come from the memory-mapped sidecar via chunks.vec_row (used
+    in place when rows are the file prefix); the per-row BLOB is only read
+    for older rows the sidecar does not cover.
+    """
+    records = open_sidecar(dim)
+    n_records = 0 if records is None else records.shape[0]
     cur = conn.cursor()
-    cur.execute("SELECT c.text, c.embedding, c.dim, d.filename, d.doc_type FROM chunks c JOIN documents d ON c.document_id = d.id")
-    rows = cur.fetchall()
-    conn.close()
-
-    results: List[Tuple[float, Dict[str, Any]]] = []
-    for text_chunk, emb_blob, dim, filename, doc_type in rows:
-        vec = np.frombuffer(emb_blob, dtype=np.float32)
-        if vec.shape[0] != dim:
-            continue
-        score = float(np.dot(vec, q_vec))  # cosine similarity (normalized)
-        results.append((score, {"text": text_chunk, "filename": filename, "doc_type": doc_type, "score": score}))
+    cur.execute(
+        "SELECT c.vec_row, CASE WHEN c.vec_row IS NULL OR c.vec_row >= ? THEN c.embedding END, c.dtype, "
+        "c.text, d.filename, d.doc_type FROM chunks c JOIN documents d ON c.document_id = d.id WHERE c.dim = ?",
+        (n_records, dim),
+    )
+    # Metadata stays in per-column lists; sidecar rows go into a preallocated
+    # buffer (doubled as needed) and BLOB fallbacks are decoded per fetched
+    # batch, so no more than FETCH_ROWS row tuples are alive at once
+    rows = np.empty(FETCH_ROWS, dtype=np.int64)
+    texts: List[str] = []
+    filenames: List[str] = []
+    doc_types: List[str] = []
+    fallback_pos: List[np.ndarray] = []
+    fallback_codes: List[np.ndarray] = []
+    fallback_scales: List[np.ndarray] = []
+    while True:
+        batch = cur.fetchmany(FETCH_ROWS)
+        if not batch:
+            break
+        blobs: Dict[str | None, List[bytes]] = {}
+        positions: Dict[str | None, List[int]] = {}
+        for vec_row, emb_blob, dtype, text_chunk, filename, doc_type in batch:
+            n = len(texts)
+            if emb_blob is not None:
+                if len(emb_blob) != (4 + dim if dtype == "i8" else 4 * dim):
+                    continue  # malformed BLOB
+                positions.setdefault(dtype, []).append(n)
+                blobs.setdefault(dtype, []).append(emb_blob)
+                vec_row = -1
+            elif vec_row is None or vec_row >= n_records:
+                continue  # sidecar-only row whose record was lost (file removed or cut short)
+            if n == rows.shape[0]:
+                rows = np.concatenate([rows, np.empty_like(rows)])
+            rows[n] = vec_row
+            texts.append(text_chunk)
+            filenames.append(filename)
+            doc_types.append(doc_type)
+        for dtype, group in blobs.items():
+            c, sc = decode_blobs(group, dtype, dim)
+            fallback_pos.append(np.array(positions[dtype], dtype=np.int64))
+            fallback_codes.append(c)
+            fallback_scales.append(sc)
+    rows = rows[: len(texts)]
+
+    meta = {"texts": texts, "filenames": filenames, "doc_types": doc_types}
+    if rows.shape[0] and not fallback_pos and np.array_equal(rows, np.arange(rows.shape[0])):
+        # Rows are the sidecar prefix: score straight off the mapping, no copy
+        picked = records[: rows.shape[0]]
+        return {"codes": picked["q"], "scales": np.array(picked["scale"], dtype=np.float32), **meta}
+    codes = np.empty((len(texts), dim), dtype=np.int8)
+    scales = np.empty(len(texts), dtype=np.float32)
+    mapped = rows >= 0
+    if mapped.any():
+        picked = records[rows[mapped]]
+        codes[mapped] = picked["q"]
+        scales[mapped] = picked["scale"]
+    for pos, c, sc in zip(fallback_pos, fallback_codes, fallback_scales):
+        codes[pos], scales[pos] = c, sc
+    return {"codes": codes, "scales": scales, **meta}
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first; equal scores keep row order.
+
+    argpartition finds the k-th best score in O(N); only rows at or above it
+    (ties included, so the result matches a stable full sort) get sorted.
+    """
+    n = scores.shape[0]
+    if k < n:
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(n)
+    # lexsort: last key is primary (score desc), then row index
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+
+
+def _search_scan(conn: sqlite3.Connection, q_vec: np.ndarray, start: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Score every stored chunk against the query vector with int8 dot products."""
+    index = _get_doc_index(conn, q_vec.shape[0])
+    scores = score_int8(index["codes"], index["scales"], q_vec)  # cosine similarity (normalized)
+    order = _top_k(scores, start + limit)[start:]
+    texts, filenames, doc_types = index["texts"], index["filenames"], index["doc_types"]
+    page = [
+        {"text": texts[i], "filename": filenames[i], "doc_type": doc_types[i], "score": float(scores[i])}
+        for i in order
+    ]
+    return page, len(texts)
+
+
+def _search_documents(query_text: str, top_k: int = 8, offset: int = 0, q_vec: np.ndarray | None = None) -> Dict[str, Any]:
+    if not os.path.exists(INGEST_DB):
+        return {"type": "document", "results": []}
+    if q_vec is None:
+        q_vec = _query_encoder.encode(query_text)
 
-    results.sort(key=lambda x: x[0], reverse=True)
-    total = len(results)
     start = max(0, int(offset))
-    end = start + max(1, int(top_k))
-    page = [item for _, item in results[start:end]]
-    return {"type": "document", "results": page, "pagination": {"limit": max(1, int(top_k)), "offset": start, "total": total}}
+    limit = max(1, int(top_k))
+    conn = get_connection()
+    # Native KNN when sqlite-vec is loaded and the index exists; full scan otherwise
+    use_vec = (
+        start + limit <= VEC_MAX_K
+        and load_vec_extension(conn)
+        and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_vec'").fetchone() is not None
+    )
+    if use_vec:
+        page, total = _search_vec(conn, q_vec, start, limit)
+    else:
+        page, total = _search_scan(conn, q_vec, start, limit)
+    return {"type": "document", "results": page, "pagination": {"limit": limit, "offset": start, "total": total}}
 
 
 # ------------------------- Hybrid Merge -------------------------
@@ -659,9 +1019,28 @@ def _merge_hybrid(sql_res: Dict[str, Any], doc_res: Dict[str, Any]) -> Dict[str,
 
 # ------------------------- Public API -------------------------
 def process_query(user_query: str, connection_string: str | None = None, limit: int = 50, offset: int = 0, doc_limit: int = 8, doc_offset: int = 0) -> Dict[str, Any]:
+    return _process_query(user_query, connection_string, limit, offset, doc_limit, doc_offset)
+
+
+def process_queries(queries: Sequence[str], connection_string: str | None = None, limit: int = 50, offset: int = 0, doc_limit: int = 8, doc_offset: int = 0) -> List[Dict[str, Any]]:
+    """Answer several queries, encoding all uncached document searches in one model call."""
+    pending = [
+        q for q in dict.fromkeys(queries)
+        if _classify(q) != "sql" and _cache.get(_cache_key(q, connection_string, limit)) is None
+    ]
+    vecs: Dict[str, np.ndarray] = {}
+    if pending and os.path.exists(INGEST_DB):
+        vecs = dict(zip(pending, _encode_queries(pending)))
+    return [
+        _process_query(q, connection_string, limit, offset, doc_limit, doc_offset, vecs.get(q))
+        for q in queries
+    ]
+
+
+def _process_query(user_query: str, connection_string: str | None, limit: int, offset: int, doc_limit: int, doc_offset: int, q_vec: np.ndarray | None = None) -> Dict[str, Any]:
     t0 = time.time()
     _inc("total_queries", 1)
-    cache_key = json.dumps({"q": user_query, "cs": connection_string, "l": limit}, sort_keys=True)
+    cache_key = _cache_key(user_query, connection_string, limit)
     cached = _cache.get(cache_key)
     if cached is not None:
         elapsed = time.time() - t0
@@ -674,16 +1053,24 @@ def process_query(user_query: str, connection_string: str | None = None, limit:
     qtype = _classify(user_query)
     sql_res = None
     doc_res = None
+    doc_future = None
 
+    if qtype == "hybrid":
+        # Independent branches: search documents on the pool while the SQL runs here
+        doc_future = _exec.submit(_with_active_query, _search_documents, user_query, doc_limit, doc_offset, q_vec)
     if qtype in ("sql", "hybrid"):
         try:
-            intent = _infer_intent(_normalize_tokens(user_query))
-            sql_res = _with_active_query(_run_sql, user_query, connection_string, limit, offset, intent)
+            qn = _normalize_tokens(user_query)
+            intent = _infer_intent(qn)
+            sql_res = _with_active_query(_run_sql, user_query, connection_string, limit, offset, intent, qn)
         except Exception as e:
             sql_res = {"type": "sql", "error": str(e), "rows": []}
     if qtype in ("document", "hybrid"):
         try:
-            doc_res = _with_active_query(_search_documents, user_query, doc_limit, doc_offset)
+            if doc_future is not None:
+                doc_res = doc_future.result()
+            else:
+                doc_res = _with_active_query(_search_documents, user_query, doc_limit, doc_offset, q_vec)
         except Exception as e:
             doc_res = {"type": "document", "error": str(e), "results": []}
 
@@ -700,56 +1087,51 @@ def process_query(user_query: str, connection_string: str | None = None, limit:
     _record_time(elapsed)
     _cache.set(cache_key, final)
     _history.append({"q": user_query, "time": elapsed, "type": final_with_metrics.get("type"), "cache": "miss"})
-    if len(_history) > 100:
-        del _history[:-100]
     return final_with_metrics
 
 
 def recent_history(limit: int = 20) -> List[Dict[str, Any]]:
-    return list(_history[-limit:])[::-1]
+    return list(islice(reversed(_history), limit))
 
 
 def get_metrics() -> Dict[str, Any]:
     # query stats
-    times = _metrics.get("exec_times", [])
-    avg = sum(times) / len(times) if times else 0.0
-    p95 = 0.0
-    if times:
-        s = sorted(times)
-        p95 = s[min(len(s) - 1, int(0.95 * len(s)))]
+    times = np.array(list(_metrics.exec_times), dtype=np.float64)
+    avg = float(times.mean()) if times.size else 0.0
+    # "higher": an observed sample at or above the 95th percentile rank
+    p95 = float(np.percentile(times, 95, method="higher")) if times.size else 0.0
 
     # document stats from ingestion.db
     docs = 0
     chunks = 0
     if os.path.exists(INGEST_DB):
-        conn = sqlite3.connect(INGEST_DB)
-        cur = conn.cursor()
+        cur = get_connection().cursor()
         cur.execute("SELECT COUNT(*) FROM documents")
         docs = cur.fetchone()[0]
         cur.execute("SELECT COUNT(*) FROM chunks")
         chunks = cur.fetchone()[0]
-        conn.close()
 
     return {
-        "total_queries": _metrics.get("total_queries", 0),
-        "cache_hits": _metrics.get("cache_hits", 0),
-        "cache_misses": _metrics.get("cache_misses", 0),
-        "active_queries": _metrics.get("active_queries", 0),
-        "active_connections": _metrics.get("active_connections", 0),
+        "total_queries": _metrics.total_queries,
+        "cache_hits": _metrics.cache_hits,
+        "cache_misses": _metrics.cache_misses,
+        "active_queries": _metrics.active_queries,
+        "active_connections": _metrics.active_connections,
         "avg_exec_sec": avg,
         "p95_exec_sec": p95,
-        "recent_exec_times": times[-20:],
+        "recent_exec_times": times[-20:].tolist(),
         "indexed_documents": docs,
         "indexed_chunks": chunks,
     }
 
 
 def reset_metrics() -> Dict[str, Any]:
-    _metrics["total_queries"] = 0
-    _metrics["cache_hits"] = 0
-    _metrics["cache_misses"] = 0
-    _metrics["exec_times"] = []
-    _metrics["active_queries"] = 0
-    _metrics["active_connections"] = 0
+    with _metrics_lock:
+        _metrics.total_queries = 0
+        _metrics.cache_hits = 0
+        _metrics.cache_misses = 0
+        _metrics.exec_times.clear()
+        _metrics.active_queries = 0
+        _metrics.active_connections = 0
     return {"ok": True}
 
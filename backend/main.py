@@ -1,19 +1,35 @@
+import os
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from backend.api.routes.schema import router as schema_router
 from backend.api.routes.ingestion import router as ingestion_router
 from backend.api.routes.query import router as query_router
+from backend.api.services.db_engines import dispose_engines
+from backend.nlp.embeddings import warm_model
+from backend.nlp.intent_model import warm_store
+
+try:
+    import orjson  # noqa: F401  (Rust JSON encoder; much faster on large schema/result payloads)
+    default_response_class = ORJSONResponse
+except ImportError:
+    default_response_class = JSONResponse
 
-app = FastAPI(title="NLP Query Engine for Employee Data")
+app = FastAPI(title="NLP Query Engine for Employee Data", default_response_class=default_response_class)
 
-# CORS for local dev (adjust in production)
+# CORS: explicit origins (comma-separated ALLOW_ORIGINS; default is the Vite dev server).
+# The frontend sends no cookies, so credentials stay off.
+ALLOW_ORIGINS = [
+    o.strip() for o in os.environ.get("ALLOW_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173").split(",") if o.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=ALLOW_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
 )
 
 # Include routers
@@ -22,6 +38,30 @@ app.include_router(ingestion_router, prefix="/api", tags=["ingestion"])
 app.include_router(query_router, prefix="/api", tags=["query"])
 
 
+@app.on_event("startup")
+async def _warm_model():
+    # Load the embedding model before the first upload/query needs it
+    try:
+        await run_in_threadpool(warm_model)
+    except Exception:
+        pass  # e.g. model not downloadable offline; it is loaded on first use instead
+
+
+@app.on_event("startup")
+async def _warm_intent_store():
+    # The first worker up publishes the corpus to shared memory; the others attach to it
+    try:
+        await run_in_threadpool(warm_store)
+    except Exception:
+        pass  # store not built: rule-based intents until it is
+
+
+@app.on_event("shutdown")
+async def _dispose_engines():
+    # Close pooled DB connections cleanly instead of dropping them at exit
+    dispose_engines()
+
+
 @app.get("/")
 async def root():
     return {"status": "ok", "service": "nlp-query-engine"}
@@ -29,7 +69,8 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    # Start uvicorn server in-process (no reloader, no subprocess spawn)
+    # Start uvicorn server in-process (no reloader, no subprocess spawn);
+    # loop="auto" (the default) already picks uvloop when it is installed
     config = uvicorn.Config(app=app, host="127.0.0.1", port=8000, reload=False)
     server = uvicorn.Server(config)
     server.run()
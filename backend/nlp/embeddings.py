@@ -0,0 +1,152 @@
+"""Sentence embedding backend shared by ingestion and search.
+
+`get_model()` returns an object exposing a SentenceTransformer-compatible
+`encode()`. On a CUDA machine the PyTorch SentenceTransformer runs on the
+GPU. Otherwise, when an int8-quantized ONNX export of MiniLM is present it
+is served through ONNX Runtime on the CPU, falling back to the PyTorch
+model on the CPU. Export the quantized model once with:
+
+    python -m backend.nlp.embeddings
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, List, Sequence
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_DIR = os.environ.get(
+    "EMBEDDING_ONNX_DIR", os.path.join(os.getcwd(), "storage", "onnx", "all-MiniLM-L6-v2-int8")
+)
+ONNX_FILE = "model_quantized.onnx"
+# ONNX Runtime intra-op threads; half the cores leaves room for request handling
+ORT_THREADS = int(os.environ.get("EMBEDDING_ORT_THREADS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+
+
+class OnnxEncoder:
+    """MiniLM encoder running an int8 ONNX graph with mean pooling."""
+
+    def __init__(self, model_dir: str, file_name: str = ONNX_FILE, max_seq_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = ORT_THREADS
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, file_name),
+            sess_options=opts,
+            providers=["CPUExecutionProvider"],
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        out_dim = self.session.get_outputs()[0].shape[-1]
+        self.dim = out_dim if isinstance(out_dim, int) else 384
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(
+        self,
+        sentences: str | Sequence[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        out: List[np.ndarray] = []
+        for i in range(0, len(texts), batch_size):
+            enc = self.tokenizer(
+                texts[i : i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]  # (B, T, D)
+            # Mean pooling over non-padding tokens
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            vecs = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+            out.append(vecs.astype(np.float32, copy=False))
+        embs = np.concatenate(out) if out else np.empty((0, self.dim), dtype=np.float32)
+        return embs[0] if single else embs
+
+
+def export_onnx_model(out_dir: str = ONNX_DIR) -> str:
+    """Export MiniLM to ONNX and apply dynamic int8 quantization (needs `optimum`)."""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    fp32_dir = f"{out_dir}-fp32"
+    ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True).save_pretrained(fp32_dir)
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(out_dir)
+    quantizer = ORTQuantizer.from_pretrained(fp32_dir)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+    return os.path.join(out_dir, ONNX_FILE)
+
+
+_model_lock = threading.Lock()
+_model: Any = None
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def _load_model() -> Any:
+    # A GPU beats the int8 CPU graph by a wide margin, so prefer it when present
+    if _cuda_available():
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(MODEL_NAME, device="cuda")
+    if os.path.exists(os.path.join(ONNX_DIR, ONNX_FILE)):
+        try:
+            return OnnxEncoder(ONNX_DIR)
+        except ImportError:
+            pass  # onnxruntime not installed; use the PyTorch model
+    from sentence_transformers import SentenceTransformer
+
+    # all-MiniLM-L6-v2: compact, fast
+    return SentenceTransformer(MODEL_NAME, device="cpu")
+
+
+def embedding_batch_size(model: Any) -> int:
+    """Encode batch size for `model`: larger on CUDA to keep the GPU busy."""
+    return 256 if str(getattr(model, "device", "cpu")).startswith("cuda") else 128
+
+
+def get_model() -> Any:
+    global _model
+    # Lock-free once loaded; the lock only serializes the first load
+    model = _model
+    if model is not None:
+        return model
+    with _model_lock:
+        if _model is None:
+            _model = _load_model()
+        return _model
+
+
+def warm_model() -> None:
+    """Load the model and run one encode so the first request skips lazy kernel setup."""
+    get_model().encode([""], show_progress_bar=False)
+
+
+if __name__ == "__main__":
+    print(export_onnx_model())
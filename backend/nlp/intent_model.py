@@ -1,16 +1,46 @@
 import os
 import json
-import pickle
+import threading
+import time
 from typing import List, Tuple, Dict, Any
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from backend.nlp.embeddings import get_model
+from backend.nlp.quantize import quantize_int8, score_int8
+
+try:
+    import hnswlib
+except Exception:  # optional: sub-linear lookup for large intent corpora; full scan otherwise
+    hnswlib = None
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 DATA_PATH = os.path.join(DATA_DIR, "intent_examples.jsonl")
-STORE_PATH = os.path.join(DATA_DIR, "intent_store.pkl")
+# Below this many examples the int8 full scan beats walking an HNSW graph
+ANN_MIN_ROWS = 2048
+# int8 corpus codes as a raw .npy (memory-mapped on load) + labels/texts/scales as JSON
+EMB_PATH = os.path.join(DATA_DIR, "intent_embeddings.npy")
+META_PATH = os.path.join(DATA_DIR, "intent_meta.json")
+# HNSW graph saved by the build when the corpus has at least ANN_MIN_ROWS examples
+ANN_PATH = os.path.join(DATA_DIR, "intent_hnsw.bin")
+# How often a loaded (or failed) store looks at the files again; a rebuild is picked up within this
+STORE_CHECK_SEC = 30.0
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
+_models: Dict[str, Any] = {}
+
+
+def _get_model(name: str = MODEL_NAME) -> Any:
+    # The default model is the process-wide one shared with ingestion and search
+    if name == MODEL_NAME:
+        return get_model()
+    model = _models.get(name)
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+
+        model = _models[name] = SentenceTransformer(name)
+    return model
+
 
 def _load_examples(path: str) -> Tuple[List[str], List[str]]:
     X, y = [], []
@@ -24,57 +54,179 @@ def _load_examples(path: str) -> Tuple[List[str], List[str]]:
     return X, y
 
 
+def _build_ann(embs: np.ndarray, scales: np.ndarray) -> Any:
+    """Inner-product HNSW index over the dequantized corpus, or None when not worth it."""
+    if hnswlib is None or len(embs) < ANN_MIN_ROWS:
+        return None
+    vecs = embs.astype(np.float32) * scales[:, None]
+    index = hnswlib.Index(space="ip", dim=vecs.shape[1])
+    index.init_index(max_elements=len(vecs), ef_construction=200, M=16)
+    index.add_items(vecs, np.arange(len(vecs)))
+    return index
+
+
+def _load_ann(meta: Dict[str, Any], dim: int) -> Any:
+    """The HNSW index saved with this store, or None (full scan)."""
+    n = meta.get("ann_rows")
+    if hnswlib is None or not n or n != len(meta["labels"]):
+        return None
+    index = hnswlib.Index(space="ip", dim=dim)
+    try:
+        index.load_index(ANN_PATH, max_elements=n)
+    except (OSError, RuntimeError):
+        return None  # missing or unreadable graph: the scan gives the same answers, slower
+    index.set_ef(64)
+    return index
+
+
 def _encode_corpus(texts: List[str]) -> np.ndarray:
-    model = SentenceTransformer(MODEL_NAME)
-    embs = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype("float32")
+    model = _get_model()
+    # encode() already returns float32; only cast (and copy) if a backend hands back another dtype
+    embs = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype("float32", copy=False)
     return embs
 
 
 def _build_store() -> Dict[str, Any]:
     os.makedirs(DATA_DIR, exist_ok=True)
     X, y = _load_examples(DATA_PATH)
-    embs = _encode_corpus(X)
-    store = {"embeddings": embs, "labels": y, "texts": X, "model": MODEL_NAME}
-    with open(STORE_PATH, "wb") as f:
-        pickle.dump(store, f)
-    return store
+    embs, scales = quantize_int8(_encode_corpus(X))
+    meta = {"labels": y, "texts": X, "model": MODEL_NAME, "scales": scales.tolist()}
+    # Embeddings and graph first, meta last: the meta file marks a complete store
+    tmp = f"{EMB_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, embs)
+    os.replace(tmp, EMB_PATH)
+    ann = _build_ann(embs, scales)
+    if ann is not None:
+        tmp = f"{ANN_PATH}.{os.getpid()}.tmp"
+        ann.save_index(tmp)
+        os.replace(tmp, ANN_PATH)
+        meta["ann_rows"] = len(embs)
+    elif os.path.exists(ANN_PATH):
+        os.remove(ANN_PATH)
+    tmp = f"{META_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, META_PATH)
+    if ann is not None:
+        ann.set_ef(64)
+    return _with_corpus(meta, embs, scales, ann)
+
+
+def _with_corpus(meta: Dict[str, Any], embs: np.ndarray, scales: np.ndarray, ann: Any) -> Dict[str, Any]:
+    # Scoring reads the int8 codes directly: a mapped store costs each worker no private copy
+    return {**meta, "embeddings": embs, "scales": scales, "ann": ann}
+
+
+def _load_store() -> Dict[str, Any]:
+    with open(META_PATH, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    # mmap: pages come from the OS page cache on touch and are shared across workers
+    embs = np.load(EMB_PATH, mmap_mode="r")
+    # Checked once here so scoring never needs a defensive cast or contiguity copy
+    if embs.dtype != np.int8 or not embs.flags.c_contiguous:
+        raise RuntimeError("intent store embeddings must be C-contiguous int8; run python -m backend.nlp.intent_model")
+    scales = np.asarray(meta["scales"], dtype=np.float32)
+    return _with_corpus(meta, embs, scales, _load_ann(meta, embs.shape[1]))
 
 
 _store: Dict[str, Any] | None = None
+_store_sig: Tuple[int, int] | None = None
+_store_error: str | None = None
+_last_check = float("-inf")
+_store_lock = threading.Lock()
+
+
+def _store_signature() -> Tuple[int, int] | None:
+    # The meta file is replaced last by a build, so it versions the whole store
+    try:
+        st = os.stat(META_PATH)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
 
 def _get_store() -> Dict[str, Any]:
-    global _store
-    if _store is not None:
-        return _store
-    if os.path.exists(STORE_PATH):
-        # Rebuild if examples are newer than the store
-        try:
-            store_mtime = os.path.getmtime(STORE_PATH)
-            data_mtime = os.path.getmtime(DATA_PATH)
-        except OSError:
-            store_mtime = 0
-            data_mtime = 1
-        if data_mtime > store_mtime:
-            _store = _build_store()
+    global _store, _store_sig, _store_error, _last_check
+    # Between checks: no syscalls, just the cached store (or the cached failure)
+    if time.monotonic() - _last_check < STORE_CHECK_SEC:
+        if _store is not None:
             return _store
-        with open(STORE_PATH, "rb") as f:
-            _store = pickle.load(f)
+        if _store_error is not None:
+            raise RuntimeError(_store_error)
+    with _store_lock:
+        if time.monotonic() - _last_check >= STORE_CHECK_SEC or (_store is None and _store_error is None):
+            _last_check = time.monotonic()
+            sig = _store_signature()
+            if _store is None or sig != _store_sig:
+                try:
+                    _store, _store_sig, _store_error = _open_store(), sig, None
+                except RuntimeError as e:
+                    # A broken rebuild keeps serving the previous store
+                    if _store is None:
+                        _store_error = str(e)
+        if _store is None:
+            raise RuntimeError(_store_error)
         return _store
-    _store = _build_store()
-    return _store
+
+
+def _open_store() -> Dict[str, Any]:
+    # Building encodes the whole corpus; that happens offline, never on a request
+    if not (os.path.exists(META_PATH) and os.path.exists(EMB_PATH)):
+        raise RuntimeError("intent store not built; run python -m backend.nlp.intent_model")
+    store = _load_store()
+    # Stale when the examples were edited after the build (content, not mtimes: checkouts reorder those)
+    X, y = _load_examples(DATA_PATH)
+    if store["texts"] != X or store["labels"] != y:
+        raise RuntimeError("intent store is stale; run python -m backend.nlp.intent_model")
+    return store
+
+
+def warm_store() -> None:
+    """Load the intent store before the first request."""
+    _get_store()
+
+
+def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest sims, best first (ties: lower index first).
+
+    argpartition selects in O(N); only the k winners are sorted.
+    """
+    k = min(k, len(sims))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k == 1:
+        return np.array([np.argmax(sims)])
+    top = np.argpartition(sims, -k)[-k:]
+    # argpartition picks arbitrarily among values tied at the cut; take all of them
+    top = np.flatnonzero(sims >= sims[top].min())
+    return top[np.lexsort((top, -sims[top]))][:k]
+
+
+def predict_intents(text: str, k: int = 3) -> List[Tuple[str, float]]:
+    """The k nearest labeled examples as [(label, similarity), ...], best first.
+    Labels can repeat; callers thresholding near-ties compare the scores.
+    """
+    s = _get_store()
+    model = _get_model(s.get("model", MODEL_NAME))
+    # A bare string encodes as a single 1-D vector, without the batch wrapping
+    q = model.encode(text.lower(), convert_to_numpy=True, normalize_embeddings=True).astype("float32", copy=False)
+    ann = s.get("ann")
+    if ann is not None:
+        ids, dists = ann.knn_query(q, k=min(k, ann.get_current_count()))
+        # ip space: distance = 1 - dot
+        return [(s["labels"][int(i)], float(1.0 - d)) for i, d in zip(ids[0], dists[0])]
+    sims = score_int8(s["embeddings"], s["scales"], q)  # cosine similarity (normalized)
+    return [(s["labels"][int(i)], float(sims[i])) for i in _top_k(sims, k)]
 
 
 def predict_intent(text: str) -> Tuple[str, float]:
     """Nearest-neighbor intent over labeled examples using cosine similarity.
     Returns (label, confidence) where confidence is top similarity.
     """
-    s = _get_store()
-    model = SentenceTransformer(s.get("model", MODEL_NAME))
-    q = model.encode([text.lower()], convert_to_numpy=True, normalize_embeddings=True).astype("float32")[0]
-    corpus = s["embeddings"]  # (N, d)
-    sims = (corpus @ q).astype("float32")  # cosine since normalized
-    idx = int(np.argmax(sims))
-    label = s["labels"][idx]
-    conf = float(sims[idx])
-    return label, conf
+    return predict_intents(text, k=1)[0]
+
+
+if __name__ == "__main__":
+    _build_store()
+    print(EMB_PATH)
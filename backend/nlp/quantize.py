@@ -0,0 +1,72 @@
+"""Per-row symmetric int8 quantization shared by ingestion, search and the
+intent store.
+
+Each vector is kept as int8 codes plus one float32 scale (max |v| / 127), so
+codes * scale ~= v. Packed rows (emb_cache BLOBs, chunk sidecar records) are
+the 4-byte scale followed by the codes.
+"""
+
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np
+
+# Rows converted to float32 per scoring step; keeps the converted block cache-resident
+SCORE_BLOCK_ROWS = 4096
+
+
+def quantize_int8(vecs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(codes, scales) for one vector or a matrix of rows, with vecs ~= codes * scales."""
+    scales = np.max(np.abs(vecs), axis=-1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.round(vecs / scales[..., None]).clip(-127, 127).astype(np.int8)
+    return codes, scales
+
+
+def pack_int8(vecs: np.ndarray) -> np.ndarray:
+    """Quantize rows into one contiguous uint8 matrix of packed rows."""
+    codes, scales = quantize_int8(vecs)
+    packed = np.empty((codes.shape[0], 4 + codes.shape[1]), dtype=np.uint8)
+    packed[:, :4] = scales[:, None].view(np.uint8)
+    packed[:, 4:] = codes.view(np.uint8)
+    return packed
+
+
+def unpack_int8(packed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(codes, scales) of packed uint8 rows; codes is a view."""
+    return packed[:, 4:].view(np.int8), np.ascontiguousarray(packed[:, :4]).view(np.float32)[:, 0]
+
+
+def dequantize_int8(packed: np.ndarray) -> np.ndarray:
+    """Float32 matrix from packed uint8 rows."""
+    codes, scales = unpack_int8(packed)
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def decode_blobs(blobs: List[bytes], dtype: str | None, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Same-dtype embedding BLOBs as (codes, scales).
+
+    'i8' BLOBs are packed rows; anything else is raw float32 and is quantized
+    the same way ingestion does.
+    """
+    raw = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+    if dtype == "i8":
+        return unpack_int8(raw.reshape(len(blobs), 4 + dim))
+    return quantize_int8(raw.view(np.float32).reshape(len(blobs), dim))
+
+
+def score_int8(codes: np.ndarray, scales: np.ndarray, q_vec: np.ndarray) -> np.ndarray:
+    """Dot products of int8 rows with the int8-quantized query, rescaled to float32.
+
+    Blocks of codes are widened to float32 for BLAS; int8 x int8 sums stay
+    below 2**24 for dim <= 1040, so the integer dot products are exact.
+    """
+    qq, q_scale = quantize_int8(q_vec)
+    qf = qq.astype(np.float32)
+    out = np.empty(codes.shape[0], dtype=np.float32)
+    for i in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+        out[i : i + SCORE_BLOCK_ROWS] = codes[i : i + SCORE_BLOCK_ROWS].astype(np.float32) @ qf
+    out *= scales
+    out *= q_scale
+    return out
@@ -2,8 +2,12 @@ import sqlite3
 from datetime import date
 
 # Create a richer sample database for advanced queries
-conn = sqlite3.connect('example.db')
+# Autocommit connection: the seed below runs in one explicit transaction
+conn = sqlite3.connect('example.db', isolation_level=None)
 cur = conn.cursor()
+# WAL: one journal append per commit instead of rollback-journal rewrites; readers don't block writers
+cur.execute('PRAGMA journal_mode=WAL')
+cur.execute('PRAGMA synchronous=NORMAL')
 
 # Reset schema to avoid column mismatch from previous runs
 cur.execute('PRAGMA foreign_keys = OFF;')
@@ -14,6 +18,8 @@ for t in [
     cur.execute(f'DROP TABLE IF EXISTS {t}')
 cur.execute('PRAGMA foreign_keys = ON;')
 
+cur.execute('BEGIN')
+
 """Simple HR schema required by app
 Tables:
   - departments (dept_id, dept_name, manager_id)
@@ -75,7 +81,19 @@ VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     (13, 'Empty Case', None, None, None, None, None, '', '', None),
 ])
 
-conn.commit()
+# Indexes for the columns generated queries join and filter on
+# (dept joins, "who reports to X", name lookups, department names)
+for ddl in [
+    'CREATE INDEX IF NOT EXISTS ix_emp_dept_id ON employees(dept_id)',
+    'CREATE INDEX IF NOT EXISTS ix_emp_reports_to ON employees(reports_to)',
+    'CREATE INDEX IF NOT EXISTS ix_emp_full_name ON employees(full_name)',
+    'CREATE INDEX IF NOT EXISTS ix_dep_dept_name ON departments(dept_name)',
+]:
+    cur.execute(ddl)
+
+cur.execute('COMMIT')
+# Planner statistics (sqlite_stat1) so index choice doesn't rely on defaults
+cur.execute('ANALYZE')
 conn.close()
 
 print('Created example.db with simple schema: employees & departments with 13 employees (includes edge cases)')